@@ -0,0 +1,427 @@
+"""
+Benchmarks the translate and TTS hot paths across input lengths, batch sizes and
+concurrency levels, and writes the results as JSON.
+
+Workloads:
+    translate         SpeechToTranslate.translate_batch (NLLB)
+    translate_stream  SpeechToTranslate.translate_stream, for time to first token
+    f5                infer_batch_process with the F5-TTS server's model and vocoder
+    xtts              Coqui XTTS v2, as run by the cloning server
+    stub_translate,   Sleep-based stand-ins with no model or dependencies, for checking
+    stub_tts          the harness itself and for CI runs
+
+Each workload (and each of --translate-backends for the translate workloads) runs in
+its own subprocess so its load time and peak RSS are measured in isolation.
+For CPU runs with small models, point TRANSLATE_MODEL_ID (or --translate-model) at a
+small checkpoint and use TTS_DEVICE=cpu.
+
+    python benchmark.py --workloads stub_translate stub_tts --output bench.json
+    python benchmark.py --workloads translate --translate-model facebook/nllb-200-distilled-600M \\
+        --lengths 8 32 128 --batch-sizes 1 8 --concurrency 1 4 --output bench.json
+    python benchmark.py --workloads translate --translate-backends torch torch_int8 onnx --device cpu
+    python benchmark.py --workloads translate --output new.json --baseline old.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "flask"))
+
+WORKLOADS = ("translate", "translate_stream", "f5", "xtts", "stub_translate", "stub_tts")
+# Workloads run once per --translate-backends entry
+TRANSLATE_WORKLOADS = ("translate", "translate_stream")
+
+SAMPLE_TEXT = (
+    "The weather is lovely today, so we are going for a walk in the park after lunch. "
+    "Later we will meet a few friends at the station and take the train into the city. "
+)
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_text(words):
+    """A deterministic input of `words` words cut from the sample text."""
+    sample = SAMPLE_TEXT.split()
+    return " ".join(sample[i % len(sample)] for i in range(words))
+
+
+def percentile(values, q):
+    """Linearly interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize(values, digits=2):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "p99": round(percentile(values, 99), digits),
+        "mean": round(sum(values) / len(values), digits),
+        "max": round(max(values), digits),
+    }
+
+
+# --- Workloads ---
+# A workload is a callable run(texts) that yields once per output chunk. For TTS
+# it yields the number of audio samples in the chunk, for translation 0. Its
+# `sample_rate` attribute is None when it produces no audio.
+
+
+class TranslateWorkload:
+    sample_rate = None
+
+    def __init__(self, args, stream=False):
+        if args.translate_model:
+            os.environ["TRANSLATE_MODEL_ID"] = args.translate_model
+        if args.replicas > 1:
+            from replicas import TranslationPool
+
+            # Replicas live in child processes, so rss_mb_* below only covers the process owning the shared weights
+            self.s2t = TranslationPool(replicas=args.replicas, backend=args.translate_backends[0])
+        else:
+            from main import SpeechToTranslate
+
+            self.s2t = SpeechToTranslate(
+                input_lang=args.source_lang, output_lang=args.target_lang, backend=args.translate_backends[0], device=args.device
+            )
+        self.stream = stream
+        self.source_lang, self.target_lang = args.source_lang, args.target_lang
+
+    def __call__(self, texts):
+        if not self.stream:
+            self.s2t.translate_batch(texts, self.target_lang, self.source_lang)
+            yield 0
+            return
+        for text in texts:
+            for _ in self.s2t.translate_stream(text, self.target_lang, self.source_lang):
+                yield 0
+
+
+class F5Workload:
+    def __init__(self, args):
+        os.environ.setdefault("TTS_WARMUP", "0")
+        spec = importlib.util.spec_from_file_location("f5_tts_server", os.path.join(ROOT, "f5-tts.py"))
+        self.server = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.server)
+        self.server.load_tts_resources()
+        self.sample_rate = self.server.sampling_rate
+
+        from importlib.resources import files
+
+        ref_audio = args.ref_audio or str(files("f5_tts").joinpath("infer/examples/basic/basic_ref_en.wav"))
+        ref_text = args.ref_text or ("" if args.ref_audio else "Some call me nature, others call me mother nature.")
+        self.ref_audio, self.ref_sr, self.ref_text = self.server.process_reference(ref_audio, ref_text)
+        self.chunk_size = self.server.STREAM_CHUNK_SIZE
+
+    def __call__(self, texts):
+        for audio_chunk, _ in self.server.infer_batch_process(
+            ref_audio=(self.ref_audio, self.ref_sr),
+            ref_text=self.ref_text,
+            texts_to_infer=texts,
+            model=self.server.f5_model,
+            vocoder=self.server.vocoder,
+            progress=None,
+            device=self.server.device,
+            streaming=True,
+            chunk_size=self.chunk_size,
+        ):
+            yield len(audio_chunk)
+
+
+class XTTSWorkload:
+    def __init__(self, args):
+        from TTS.api import TTS
+
+        if not args.ref_audio:
+            raise ValueError("The xtts workload needs --ref-audio")
+        self.tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
+        self.tts.to(os.environ.get("TTS_DEVICE", "cpu"))
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
+        self.ref_audio = args.ref_audio
+        self.language = args.xtts_language
+
+    def __call__(self, texts):
+        for text in texts:
+            wav = self.tts.tts(text=text, speaker_wav=[self.ref_audio], language=self.language, split_sentences=True)
+            yield len(wav)
+
+
+class StubTranslateWorkload:
+    """Costs a fixed overhead plus a per-character time, like an autoregressive decoder."""
+    sample_rate = None
+
+    def __init__(self, args):
+        self.lock = threading.Lock()  # One "model", so concurrent calls queue up as they would on a real one
+
+    def __call__(self, texts):
+        with self.lock:
+            time.sleep(0.002 + 0.00005 * sum(len(t) for t in texts))
+        yield 0
+
+
+class StubTTSWorkload:
+    """Yields 2048-sample chunks of 24 kHz audio at roughly 0.06 s of speech per character."""
+    sample_rate = 24000
+    chunk_size = 2048
+
+    def __init__(self, args):
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        for text in texts:
+            remaining = int(len(text) * 0.06 * self.sample_rate)
+            with self.lock:
+                time.sleep(0.005)  # reference/text preprocessing
+            while remaining > 0:
+                samples = min(self.chunk_size, remaining)
+                with self.lock:
+                    time.sleep(samples / self.sample_rate * 0.05)
+                remaining -= samples
+                yield samples
+
+
+def load_workload(name, args):
+    if name == "translate":
+        return TranslateWorkload(args)
+    if name == "translate_stream":
+        return TranslateWorkload(args, stream=True)
+    if name == "f5":
+        return F5Workload(args)
+    if name == "xtts":
+        return XTTSWorkload(args)
+    if name == "stub_translate":
+        return StubTranslateWorkload(args)
+    if name == "stub_tts":
+        return StubTTSWorkload(args)
+    raise ValueError(f"Unknown workload '{name}', expected one of {', '.join(WORKLOADS)}")
+
+
+# --- Measurement ---
+
+
+def timed_call(workload, texts):
+    """Runs one request, returning (latency s, time to first chunk s, audio samples)."""
+    start = time.perf_counter()
+    first_chunk = None
+    samples = 0
+    for chunk_samples in workload(texts):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        samples += chunk_samples
+    return time.perf_counter() - start, first_chunk, samples
+
+
+def run_case(workload, words, batch_size, concurrency, requests):
+    texts = [make_text(words)] * batch_size
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: timed_call(workload, texts), range(requests)))
+        wall = time.perf_counter() - start
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    first_chunks = [first * 1000 for _, first, _ in results if first is not None]
+    case = {
+        "input_words": words,
+        "input_chars": len(texts[0]),
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall, 3),
+        "latency_ms": summarize(latencies),
+        "time_to_first_chunk_ms": summarize(first_chunks),
+        "throughput_rps": round(requests / wall, 3),
+        "throughput_items_per_s": round(requests * batch_size / wall, 3),
+        "throughput_chars_per_s": round(requests * batch_size * len(texts[0]) / wall, 1),
+    }
+    if workload.sample_rate:
+        # Real-time factor: seconds of compute per second of audio produced (< 1 is faster than real time)
+        rtfs = [latency / (samples / workload.sample_rate) for latency, _, samples in results if samples]
+        audio_seconds = sum(samples for _, _, samples in results) / workload.sample_rate
+        case["audio_seconds"] = round(audio_seconds, 3)
+        case["rtf"] = summarize(rtfs, digits=4)
+        case["audio_seconds_per_wall_second"] = round(audio_seconds / wall, 3)
+    case["rss_mb_peak"] = round(peak_rss_mb(), 1)
+    return case
+
+
+def run_single(name, args):
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    workload = load_workload(name, args)
+    load_seconds = time.perf_counter() - start
+    rss_after_load = peak_rss_mb()
+
+    for _ in range(args.warmup):
+        timed_call(workload, [make_text(args.lengths[0])])
+
+    cases = []
+    for words in args.lengths:
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                requests = max(args.requests, concurrency)
+                cases.append(run_case(workload, words, batch_size, concurrency, requests))
+                print(f"{name}: {words} words, batch {batch_size}, concurrency {concurrency} done", file=sys.stderr)
+
+    return {
+        "workload": name,
+        "backend": args.translate_backends[0] if name in TRANSLATE_WORKLOADS else None,
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb_before_load": round(rss_before, 1),
+        "rss_mb_after_load": round(rss_after_load, 1),
+        "rss_mb_peak": round(peak_rss_mb(), 1),
+        "cases": cases,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def label(result):
+    return f"{result['workload']}[{result['backend']}]" if result.get("backend") else result["workload"]
+
+
+def case_key(result, case):
+    return (label(result), case["input_words"], case["batch_size"], case["concurrency"])
+
+
+def forwarded_args(argv, drop):
+    """argv without the options in `drop` and their values, for passing the rest on to a child run."""
+    forwarded, skipping = [], False
+    for arg in argv:
+        if arg.startswith("--"):
+            skipping = arg.split("=")[0] in drop
+        if not skipping:
+            forwarded.append(arg)
+    return forwarded
+
+
+def compare(results, baseline, tolerance):
+    """Returns a line per case whose p95 latency or time to first chunk regressed beyond `tolerance`."""
+    previous = {
+        case_key(r, case): case for r in baseline.get("results", []) for case in r["cases"]
+    }
+    regressions = []
+    for r in results:
+        for case in r["cases"]:
+            old = previous.get(case_key(r, case))
+            if old is None:
+                continue
+            for metric in ("latency_ms", "time_to_first_chunk_ms"):
+                if not case.get(metric) or not old.get(metric):
+                    continue
+                new_p95, old_p95 = case[metric]["p95"], old[metric]["p95"]
+                if old_p95 and new_p95 > old_p95 * (1 + tolerance):
+                    regressions.append(
+                        f"{label(r)} words={case['input_words']} batch={case['batch_size']} "
+                        f"concurrency={case['concurrency']}: {metric} p95 {old_p95} -> {new_p95}"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", default=["stub_translate", "stub_tts"], choices=WORKLOADS)
+    parser.add_argument("--lengths", nargs="+", type=int, default=[8, 32, 128], help="Input lengths in words")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--requests", type=int, default=20, help="Requests per case (at least the concurrency)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed requests after loading")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--device", default="cpu", help="Translation device")
+    parser.add_argument("--translate-model", default=None, help="Overrides TRANSLATE_MODEL_ID")
+    parser.add_argument("--translate-backends", nargs="+", default=["torch"], help="Backends the translate workloads are run with")
+    parser.add_argument("--replicas", type=int, default=1, help="Serve translate workloads from a TranslationPool of this many processes")
+    parser.add_argument("--source-lang", default="eng_Latn")
+    parser.add_argument("--target-lang", default="hin_Deva")
+    parser.add_argument("--ref-audio", default=None, help="Reference speaker audio (required for xtts)")
+    parser.add_argument("--ref-text", default="", help="Transcript of the reference audio (f5)")
+    parser.add_argument("--xtts-language", default="hi")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed p95 slowdown against the baseline")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    if args.single:
+        print(json.dumps(run_single(args.workloads[0], args)))
+        return
+
+    results = []
+    # Same options, one workload and backend per child
+    forwarded = forwarded_args(sys.argv[1:], ("--workloads", "--translate-backends"))
+    for name in args.workloads:
+        for backend in args.translate_backends if name in TRANSLATE_WORKLOADS else args.translate_backends[:1]:
+            cmd = [sys.executable, __file__, "--single", "--workloads", name, "--translate-backends", backend] + forwarded
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                print(f"{name} ({backend}): failed (exit code {proc.returncode})", file=sys.stderr)
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("single", "output", "baseline")},
+        },
+        "results": results,
+    }
+
+    print(f"{'workload':<28}{'load s':>8}{'words':>6}{'batch':>6}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfc p50':>10}{'rps':>9}{'rtf p50':>9}{'rss MB':>9}")
+    for r in results:
+        for c in r["cases"]:
+            ttfc = c["time_to_first_chunk_ms"]["p50"] if c["time_to_first_chunk_ms"] else "-"
+            rtf = c["rtf"]["p50"] if c.get("rtf") else "-"
+            print(
+                f"{label(r):<28}{r['load_seconds']:>8}{c['input_words']:>6}{c['batch_size']:>6}{c['concurrency']:>6}"
+                f"{c['latency_ms']['p50']:>10}{c['latency_ms']['p95']:>10}{c['latency_ms']['p99']:>10}"
+                f"{ttfc:>10}{c['throughput_rps']:>9}{rtf:>9}{c['rss_mb_peak']:>9}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,92 @@
-from TTS.api import TTS
-from flask import Flask, request, jsonify
+import os
+import sys
+import threading
+from flask import Flask, request, jsonify, send_file, Response
+from jobs import JobQueue, QueueFull, WorkersUnavailable
+
+# The instrumentation and audio output modules are shared with the translate and F5-TTS servers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flask"))
+from instrumentation import init_app, stage, track_model, current_trace_id, QUEUE_DEPTH
+from audio_output import encode_wav
+from languages import LANGUAGES, UnsupportedLanguage
 
 app = Flask(__name__)
+init_app(app, "xtts")
+
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+TTS_DEVICE = os.environ.get("TTS_DEVICE", "cuda")
+# Each worker thread owns its own XTTS replica
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "1"))
+TTS_MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", "32"))
+TTS_OUTPUT_DIR = os.environ.get("TTS_OUTPUT_DIR", "outputs")
+# Longest the synchronous /tts waits for its job; the job keeps running and can be polled on /jobs/<id>
+TTS_SYNC_TIMEOUT = float(os.environ.get("TTS_SYNC_TIMEOUT", "300"))
+# In-memory WAV results kept for /jobs/<id>/result; the oldest are dropped beyond this
+TTS_MAX_RESULT_MB = float(os.environ.get("TTS_MAX_RESULT_MB", "256"))
+# Used when a request doesn't say which language to speak
+TTS_DEFAULT_LANGUAGE = os.environ.get("TTS_DEFAULT_LANGUAGE", "hi")
+
+
+def load_tts():
+    # Imported here so the server starts (and answers /healthz) while the workers load XTTS
+    from TTS.api import TTS
+
+    tts = TTS(TTS_MODEL)
+    tts.to(TTS_DEVICE)
+    track_model(f"xtts_{threading.current_thread().name}", tts)
+    return tts
+
+
+def run_tts(tts, payload, output_path):
+    if payload.get("output") == "wav":
+        # In-memory job: the WAV bytes become the job result and no file is written
+        with stage("inference"):
+            wav = tts.tts(
+                text=payload["input"],
+                speaker_wav=[payload["audio_url"]],
+                language=payload["language"],
+                split_sentences=True
+            )
+        with stage("wav_encode"):
+            return encode_wav(wav, tts.synthesizer.output_sample_rate)
+
+    # Includes writing the file, which XTTS does inside tts_to_file
+    with stage("inference"):
+        tts.tts_to_file(
+            text=payload["input"],
+            file_path=output_path,
+            speaker_wav=[payload["audio_url"]],
+            language=payload["language"],
+            split_sentences=True
+        )
+
+
+jobs = JobQueue(
+    load_tts, run_tts, num_workers=TTS_WORKERS, max_queue=TTS_MAX_QUEUE, output_dir=TTS_OUTPUT_DIR,
+    max_result_bytes=int(TTS_MAX_RESULT_MB * 1024 * 1024),
+)
+QUEUE_DEPTH.set_function(lambda: jobs.metrics()["queue_depth"], queue="xtts_jobs")
+
+
+def submit_job():
+    response = request.get_json()
+    print(f"Received data [trace {current_trace_id()}]: {response}")
+    text, language, audio_url = response.get("input"), response.get("language"), response.get("audio_url")
+    if not text or not audio_url:
+        return None, (jsonify({"message": "Missing 'input' or 'audio_url'"}), 400)
+    try:
+        # Accepts NLLB ("hin_Deva") or ISO ("hi") codes and rejects languages XTTS can't speak
+        language = LANGUAGES.xtts(language or TTS_DEFAULT_LANGUAGE)
+    except UnsupportedLanguage as e:
+        return None, (jsonify({"message": str(e)}), 400)
+    try:
+        payload = {"input": text, "language": language, "audio_url": audio_url, "output": response.get("output", "path"), "trace_id": current_trace_id()}
+        return jobs.submit(payload), None
+    except QueueFull as e:
+        return None, (jsonify({"message": str(e)}), 429, {"Retry-After": "5"})
+    except WorkersUnavailable as e:
+        return None, (jsonify({"message": str(e)}), 503)
 
-tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
-tts.to("cuda")
 
 @app.route("/")
 def index():
@@ -15,21 +97,74 @@ def index():
 
 @app.route("/tts", methods=['POST'])
 def testtospeech():
-    response = request.get_json()
-    print(f"Received data: {response}")
-    text, language, audio_url = response.get("input"), response.get("language"), response.get("audio_url")
-    try :
-        tts.tts_to_file(
-                    text=text,
-                    file_path=f"output.wav",
-                    speaker_wav=[audio_url],
-                    language="hi",
-                    split_sentences=True
-        )
-        return jsonify({"message": "TTS completed"}), 200
-    except Exception as e:
-        print(f"Error in TTS: {e}")
-        return jsonify({"message": "Error in TTS"}), 404
+    # Synchronous wrapper around the job queue for existing callers
+    job_id, error = submit_job()
+    if error:
+        return error
+    job = jobs.wait(job_id, timeout=TTS_SYNC_TIMEOUT)
+    if job["status"] in ("queued", "running"):
+        return jsonify({"message": f"TTS did not finish within {TTS_SYNC_TIMEOUT:g}s", "job_id": job_id, "status": job["status"]}), 504
+    if job["status"] != "done":
+        return jsonify({"message": "Error in TTS", "job_id": job_id, "error": job["error"]}), 500
+    # Served once, so the audio isn't kept in memory after it has been returned
+    audio = jobs.take_result(job_id)
+    if audio is not None:
+        return Response(audio, mimetype="audio/wav", headers={"X-Job-Id": job_id})
+    # An in-memory result can be dropped under the memory cap before it is taken
+    job = jobs.get(job_id) or job
+    if job["result_dropped"]:
+        return jsonify({"message": "The audio was dropped from memory before it could be returned", "job_id": job_id}), 410
+    return jsonify({"message": "TTS completed", "job_id": job_id, "output_path": job["output_path"]}), 200
+
+@app.route("/jobs", methods=['POST'])
+def create_job():
+    job_id, error = submit_job()
+    if error:
+        return error
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route("/jobs/<job_id>", methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job"}), 404
+    return jsonify(job), 200
+
+@app.route("/jobs/<job_id>/result", methods=['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job"}), 404
+    if job["status"] != "done":
+        return jsonify({"message": f"Job is {job['status']}", "error": job["error"]}), 409
+    audio = jobs.result(job_id)
+    if audio is not None:
+        return Response(audio, mimetype="audio/wav")
+    if job["result_dropped"]:
+        return jsonify({"message": "The audio of this job is no longer held in memory"}), 410
+    return send_file(job["output_path"], mimetype="audio/wav")
+
+@app.route("/healthz", methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz", methods=['GET'])
+def readyz():
+    # Ready once at least one worker has its model loaded, failed once none can load it
+    metrics = jobs.metrics()
+    ready = metrics["workers_ready"] > 0
+    if ready:
+        status = "ready"
+    elif metrics["workers_failed"] == metrics["workers"]:
+        status = "failed"
+    else:
+        status = "loading"
+    body = {"status": status, "workers_ready": metrics["workers_ready"], "workers": metrics["workers"], "load_errors": metrics["load_errors"]}
+    return jsonify(body), 200 if ready else 503
+
+@app.route("/queue", methods=['GET'])
+def queue_metrics():
+    return jsonify(jobs.metrics()), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8000, debug=True)
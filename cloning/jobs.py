@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WorkersUnavailable(Exception):
+    pass
+
+
+class JobQueue:
+    """Bounded synthesis job queue served by a pool of worker threads.
+
+    Every worker builds its own model with `model_factory()` and runs
+    `run_job(model, payload, output_path)` for each job, writing to a per-job
+    file under `output_dir`. Whatever `run_job` returns (e.g. WAV bytes for
+    in-memory jobs) is kept as the job's result until it is taken with `take_result`,
+    or until results of newer jobs push the total past `max_result_bytes` (the
+    oldest are dropped first). When `max_queue` jobs are already waiting,
+    `submit` raises QueueFull so the caller can push back on the client.
+
+    A worker whose `model_factory()` raises records the error and exits. Once no
+    worker is left, queued jobs are failed and `submit` raises WorkersUnavailable.
+    """
+
+    def __init__(self, model_factory, run_job, num_workers=1, max_queue=32, output_dir="outputs", max_finished=1000,
+                 max_result_bytes=256 * 1024 * 1024):
+        self.model_factory = model_factory
+        self.run_job = run_job
+        self.output_dir = output_dir
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._workers_ready = 0
+        self._load_errors = []
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"tts-worker-{i}", daemon=True) for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload):
+        if self._all_workers_failed():
+            raise WorkersUnavailable(f"No TTS worker could load the model: {self._load_errors[-1]}")
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "output_path": os.path.abspath(os.path.join(self.output_dir, f"{job_id}.wav")),
+            "error": None,
+            "trace_id": payload.get("trace_id"),
+            "result": None,
+            "result_dropped": False,
+            "done": threading.Event(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self._counts["rejected"] += 1
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} waiting)")
+        with self._lock:
+            self._counts["submitted"] += 1
+        if self._all_workers_failed():
+            # The last worker failed after the check above, possibly after it drained the queue
+            self._fail_queued(f"No TTS worker could load the model: {self._load_errors[-1]}")
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else self._snapshot(job)
+
+    def wait(self, job_id, timeout=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job["done"].wait(timeout)
+        with self._lock:
+            return self._snapshot(job)
+
+    def result(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job["result"]
+
+    def take_result(self, job_id):
+        """Returns the job's result and drops it from memory, for callers that only read it once."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["result"] is None:
+                return None
+            result, job["result"] = job["result"], None
+            job["result_dropped"] = True
+            return result
+
+    @staticmethod
+    def _snapshot(job):
+        return {k: v for k, v in job.items() if k not in ("done", "result")}
+
+    def metrics(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "running": running,
+                "workers": len(self._workers),
+                "workers_ready": self._workers_ready,
+                "result_bytes": sum(len(job["result"]) for job in self._jobs.values() if job["result"] is not None),
+                "workers_failed": len(self._load_errors),
+                "load_errors": list(self._load_errors),
+                **self._counts,
+            }
+
+    def _all_workers_failed(self):
+        with self._lock:
+            return len(self._load_errors) == len(self._workers)
+
+    def _work(self):
+        try:
+            model = self.model_factory()
+        except Exception as e:
+            print(f"TTS worker {threading.current_thread().name} failed to load its model: {e}")
+            with self._lock:
+                self._load_errors.append(str(e))
+            if self._all_workers_failed():
+                self._fail_queued(f"No TTS worker could load the model: {e}")
+            return
+        with self._lock:
+            self._workers_ready += 1
+
+        while True:
+            job_id, payload = self._queue.get()
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = time.time()
+            result = None
+            try:
+                result = self.run_job(model, payload, job["output_path"])
+                status, error = "done", None
+            except Exception as e:
+                print(f"Error in TTS job {job_id} [trace {job['trace_id']}]: {e}")
+                status, error = "failed", str(e)
+
+            with self._lock:
+                job["status"] = status
+                job["error"] = error
+                job["result"] = result
+                job["finished_at"] = time.time()
+                self._counts["completed" if status == "done" else "failed"] += 1
+                self._forget_old_jobs()
+                self._drop_old_results()
+            job["done"].set()
+
+    def _fail_queued(self, error):
+        # Nothing will ever pick these up, so their waiters are released with an error
+        while True:
+            try:
+                job_id, _ = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "failed"
+                job["error"] = error
+                job["finished_at"] = time.time()
+                self._counts["failed"] += 1
+            job["done"].set()
+
+    def _drop_old_results(self):
+        held = [job for job in self._jobs.values() if job["result"] is not None]
+        total = sum(len(job["result"]) for job in held)
+        for job in held:
+            if total <= self.max_result_bytes:
+                break
+            total -= len(job["result"])
+            job["result"] = None
+            job["result_dropped"] = True
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            job = self._jobs.pop(job_id)
+            if os.path.exists(job["output_path"]):
+                os.remove(job["output_path"])
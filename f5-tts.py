@@ -1,40 +1,65 @@
-import torch
-import torchaudio
-import numpy as np
-from omegaconf import OmegaConf
-from hydra.utils import get_class
 from importlib.resources import files
-from huggingface_hub import hf_hub_download
 import logging
-import scipy.io.wavfile # To save the audio
+import base64
 import os
+import sys
 import tempfile
-from flask import Flask, request, jsonify
-
-# Import the necessary functions from f5_tts
-# Ensure f5-tts package is installed: pip install git+https://github.com/F5-TTS/F5-TTS.git
-try:
-    from f5_tts.infer.utils_infer import (
-        preprocess_ref_audio_text,
-        load_vocoder,
-        load_model,
-        infer_batch_process,
-    )
-except ImportError:
-    print("Error: f5_tts library not found or utils_infer could not be imported.")
-    print("Please ensure f5-tts is installed correctly:")
-    print("pip install git+https://github.com/F5-TTS/F5-TTS.git")
-    exit()
+import threading
+from contextlib import contextmanager, nullcontext
+from flask import Flask, request, jsonify, Response, stream_with_context
+
+from f5_registry import F5ModelRegistry, IncompatibleCheckpoint, resolve_checkpoint, hub_file, MODEL_SNAPSHOT_DIR
+from f5_speakers import SpeakerCache
+from f5_batcher import SynthesisBatcher
+
+# voice_clone_model_list lives with the translate server code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "flask"))
+from voice_models import voice_clone_model_list, voice_clone_model_configs, unloadable_voice_models
+from audio_output import FORMATS, STREAM_FORMATS, MIMETYPES, encode, stream_encode, postprocess, crossfade_join
+from languages import LANGUAGES, UnsupportedLanguage
+from instrumentation import init_app, stage, time_method, track_cache, track_model, current_trace_id, QUEUE_DEPTH, BATCH_SIZE
+
+# torch, torchaudio and f5_tts take seconds to import, so import_inference_libraries() binds them
+# in the loader thread and the server answers /healthz right away
+torch = torchaudio = convert_char_to_pinyin = None
+preprocess_ref_audio_text = load_vocoder = load_model = infer_batch_process = chunk_text = None
+hop_length = target_rms = nfe_step = cfg_strength = sway_sampling_coef = speed = None
 
 # --- Basic Logging Setup ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Not 5000, which the translate server uses; its F5_SERVER_URL points here by default
+PORT = int(os.environ.get("F5_PORT", "5002"))
 MODEL_NAME = os.environ.get("TTS_MODEL_NAME", "F5TTS_v1_Base")
-# Download checkpoint if CKPT_FILE env var is not set
-DEFAULT_CKPT_FILE = str(hf_hub_download(repo_id="SWivid/F5-TTS", filename=f"{MODEL_NAME}/model_1250000.safetensors"))
-CKPT_FILE = os.environ.get("TTS_CKPT_FILE", DEFAULT_CKPT_FILE)
+# Architecture of fine-tunes without an entry in voice_clone_model_configs
+FINETUNE_MODEL_NAME = os.environ.get("TTS_FINETUNE_MODEL_NAME", "F5TTS_Base")
+# When TTS_CKPT_FILE is not set the base checkpoint is resolved at load time (local snapshot first, then the hub)
+CKPT_FILE = os.environ.get("TTS_CKPT_FILE", "")
+DEFAULT_CKPT_REPO = "SWivid/F5-TTS"
+# Hub repos of the vocoders, checked for a local copy in MODEL_SNAPSHOT_DIR before downloading
+VOCODER_REPOS = {"vocos": "charactr/vocos-mel-24khz", "bigvgan": "nvidia/bigvgan_v2_24khz_100band_256x"}
+# Set to 0 to skip the warm-up inference and become ready sooner
+WARMUP = os.environ.get("TTS_WARMUP", "1") == "1"
 VOCAB_FILE = os.environ.get("TTS_VOCAB_FILE", "") # Optional custom vocab
+# Fine-tuned models from voice_clone_model_list kept on the device / in CPU memory
+MAX_RESIDENT_MODELS = int(os.environ.get("TTS_MAX_RESIDENT_MODELS", "2"))
+MAX_CPU_MODELS = int(os.environ.get("TTS_MAX_CPU_MODELS", "4"))
+# Samples per chunk yielded by infer_batch_process in streaming mode
+STREAM_CHUNK_SIZE = int(os.environ.get("TTS_STREAM_CHUNK_SIZE", "2048"))
+# Requests for the same speaker and model gathered into one padded model.sample() call
+SYNTH_MAX_BATCH_SIZE = int(os.environ.get("TTS_MAX_BATCH_SIZE", "16"))
+SYNTH_MAX_BATCH_CHARS = int(os.environ.get("TTS_MAX_BATCH_CHARS", "2000"))
+SYNTH_MAX_WAIT_MS = float(os.environ.get("TTS_MAX_WAIT_MS", "20"))
+# Upper bound for processed reference audio tensors kept on the device
+SPEAKER_CACHE_MB = float(os.environ.get("TTS_SPEAKER_CACHE_MB", "256"))
+# Registered speakers whose source clip is remembered, least recently used forgotten first
+MAX_SPEAKERS = int(os.environ.get("TTS_MAX_SPEAKERS", "10000"))
+# Overlap between the audio of consecutive text pieces of one long request
+CROSSFADE_SECONDS = float(os.environ.get("TTS_CROSSFADE_SECONDS", "0.15"))
+# Level used when a request asks for "normalize": true
+DEFAULT_LOUDNESS_DBFS = -20.0
+DTYPE = "float32" # Or "float16" for potential speedup/memory saving
 
 # --- Global Variables for Loaded Models (Load Once on Startup) ---
 f5_model = None
@@ -42,12 +67,167 @@ vocoder = None
 device = None
 sampling_rate = None
 mel_spec_type = None
+model_cfg = None
+model_registry = None
+speaker_cache = None
+synthesis_batcher = None
+tts_ready = threading.Event()
+load_error = None
+
+
+def import_inference_libraries():
+    """Imports torch, torchaudio and the f5_tts inference helpers into the module globals."""
+    global torch, torchaudio, convert_char_to_pinyin, preprocess_ref_audio_text, load_vocoder, load_model
+    global infer_batch_process, chunk_text, hop_length, target_rms, nfe_step, cfg_strength, sway_sampling_coef, speed
+    import torch
+    import torchaudio
+    # Ensure f5-tts package is installed: pip install git+https://github.com/F5-TTS/F5-TTS.git
+    try:
+        from f5_tts.infer.utils_infer import (
+            preprocess_ref_audio_text,
+            load_vocoder,
+            load_model,
+            infer_batch_process,
+            chunk_text,
+            hop_length,
+            target_rms,
+            nfe_step,
+            cfg_strength,
+            sway_sampling_coef,
+            speed,
+        )
+        from f5_tts.model.utils import convert_char_to_pinyin
+    except ImportError as e:
+        raise ImportError(f"f5_tts library not found or utils_infer could not be imported ({e}). "
+                          "Install it with: pip install git+https://github.com/F5-TTS/F5-TTS.git")
+
+
+def load_model_config(name):
+    from omegaconf import OmegaConf
+
+    return OmegaConf.load(str(files("f5_tts").joinpath(f"configs/{name}.yaml")))
+
+
+def build_f5_model(ckpt_path, vocab_file, target_device, cfg=None):
+    """Builds an F5-TTS model from a checkpoint using the architecture of `cfg` (MODEL_NAME's config by default)."""
+    from hydra.utils import get_class
+
+    cfg = cfg or model_cfg
+    model_cls = get_class(f"f5_tts.model.{cfg.model.backbone}")
+    model = load_model(
+        model_cls=model_cls,
+        model_arc=cfg.model.arch,
+        ckpt_path=ckpt_path,
+        mel_spec_type=mel_spec_type,
+        vocab_file=vocab_file,
+        ode_method="euler",
+        use_ema=True,
+        device=target_device,
+    ).to(target_device, dtype=getattr(torch, DTYPE))
+    model.eval() # Set model to evaluation mode
+    # infer_batch_process calls model.sample() and then the vocoder, so the two are timed separately
+    return time_method(model, "sample", "inference")
+
+
+def load_registry_model(key, repo_id, target_device):
+    """Loader used by the model registry for the fine-tunes in voice_clone_model_list."""
+    config_name = voice_clone_model_configs.get(key, FINETUNE_MODEL_NAME)
+    try:
+        cfg = load_model_config(config_name)
+    except FileNotFoundError:
+        raise IncompatibleCheckpoint(f"f5_tts has no config named {config_name}")
+    # All models share the server's vocoder, so their mel spectrograms must match it
+    if cfg.model.mel_spec.mel_spec_type != mel_spec_type or cfg.model.mel_spec.target_sample_rate != sampling_rate:
+        raise IncompatibleCheckpoint(f"{config_name} uses a different mel spectrogram than the shared {mel_spec_type} vocoder")
+
+    ckpt_path, vocab_file = resolve_checkpoint(repo_id)
+    try:
+        return build_f5_model(ckpt_path, vocab_file, target_device, cfg)
+    except RuntimeError as e:
+        # load_state_dict() reports missing, unexpected or differently shaped weights
+        if "state_dict" not in str(e):
+            raise
+        raise IncompatibleCheckpoint(f"checkpoint doesn't match the {config_name} architecture")
+
+
+def process_reference(ref_audio_path, ref_text):
+    """Runs reference preprocessing (and ASR when ref_text is empty), returning (tensor on device, sr, ref_text)."""
+    # preprocess_ref_audio_text handles transcription if ref_text is empty
+    with stage("ref_preprocess"):
+        ref_audio_path_processed, ref_text_processed = preprocess_ref_audio_text(ref_audio_path, ref_text)
+        ref_audio_tensor, ref_audio_sr = torchaudio.load(ref_audio_path_processed)
+        return ref_audio_tensor.to(device), ref_audio_sr, ref_text_processed
+
+
+def sample_batch(model, ref_audio, ref_text, texts):
+    """
+    Generates the mel spectrograms of all `texts` in one padded model.sample() call and
+    vocodes each one, mirroring the per-text pre- and post-processing of infer_batch_process.
+    Returns one float audio array per text, in order.
+    """
+    audio, sr = ref_audio
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+    rms = torch.sqrt(torch.mean(torch.square(audio)))
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    if sr != sampling_rate:
+        audio = torchaudio.transforms.Resample(sr, sampling_rate).to(audio.device)(audio)
+    audio = audio.to(device)
+
+    if len(ref_text[-1].encode("utf-8")) == 1:
+        ref_text = ref_text + " "
+    ref_audio_len = audio.shape[-1] // hop_length
+    ref_text_len = len(ref_text.encode("utf-8"))
+    durations = []
+    for text in texts:
+        # Very short texts are spoken slower, as infer_batch_process does
+        local_speed = 0.3 if len(text.encode("utf-8")) < 10 else speed
+        durations.append(ref_audio_len + int(ref_audio_len / ref_text_len * len(text.encode("utf-8")) / local_speed))
+
+    # Every row is conditioned on the same reference; shorter rows are masked past their duration
+    with torch.inference_mode():
+        generated, _ = model.sample(
+            cond=audio.repeat(len(texts), 1),
+            text=convert_char_to_pinyin([ref_text + text for text in texts]),
+            duration=torch.tensor(durations, device=device),
+            steps=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+        )
+        generated = generated.to(torch.float32)
+
+        outputs = []
+        for row, duration in enumerate(durations):
+            mel = generated[row:row + 1, ref_audio_len:duration, :].permute(0, 2, 1)
+            wave = vocoder.decode(mel) if mel_spec_type == "vocos" else vocoder(mel)
+            if rms < target_rms:
+                wave = wave * rms / target_rms
+            outputs.append(wave.squeeze().cpu().numpy())
+    return outputs
+
+
+def model_context(model_name):
+    """Context manager yielding the fine-tune `model_name` (pinned on the device) or the base model."""
+    return model_registry.use(model_name) if model_name else nullcontext(f5_model)
+
+
+def synthesize_texts(speaker_id, model_name, texts):
+    """Synthesizes several texts for one cached speaker as one batch, returning one audio array per text."""
+    # The request already looked the speaker up, so this read isn't counted as another hit
+    reference = speaker_cache.fetch(speaker_id)
+    BATCH_SIZE.observe(len(texts), batcher="f5")
+    # Callers hold the model (see submit_synthesis), so this never loads on the shared batcher thread
+    with model_context(model_name) as model:
+        return sample_batch(model, (reference["audio"], reference["sr"]), reference["ref_text"], texts)
+
 
 def load_tts_resources():
     """Loads the F5-TTS model and vocoder into global variables."""
-    global f5_model, vocoder, device, sampling_rate, mel_spec_type
+    global f5_model, vocoder, device, sampling_rate, mel_spec_type, model_cfg, model_registry, speaker_cache, synthesis_batcher
 
     logger.info("--- Initializing TTS Resources ---")
+    import_inference_libraries()
 
     # --- Device Selection ---
     if torch.cuda.is_available():
@@ -61,13 +241,9 @@ def load_tts_resources():
     device = current_device # Set global device
     logger.info(f"Using device: {device}")
 
-    # Set data type
-    dtype = torch.float32 # Or torch.float16 for potential speedup/memory saving
-
     # --- Load Model Configuration ---
     try:
-        config_path = files("f5_tts").joinpath(f"configs/{MODEL_NAME}.yaml")
-        model_cfg = OmegaConf.load(str(config_path))
+        model_cfg = load_model_config(MODEL_NAME)
     except FileNotFoundError:
         logger.error(f"Could not find configuration file for model {MODEL_NAME}. Ensure f5-tts is installed correctly.")
         raise # Re-raise the exception to prevent app start
@@ -88,40 +264,68 @@ def load_tts_resources():
 
     # --- Load F5-TTS Model ---
     logger.info("Loading F5-TTS model...")
+    ckpt_file = CKPT_FILE
     try:
-        model_cls = get_class(model_cls_path)
-        f5_model = load_model(
-            model_cls=model_cls,
-            model_arc=model_arc,
-            ckpt_path=CKPT_FILE,
-            mel_spec_type=mel_spec_type,
-            vocab_file=VOCAB_FILE,
-            ode_method="euler",
-            use_ema=True,
-            device=device,
-        ).to(device, dtype=dtype)
-        f5_model.eval() # Set model to evaluation mode
+        ckpt_file = ckpt_file or hub_file(DEFAULT_CKPT_REPO, f"{MODEL_NAME}/model_1250000.safetensors")
+        f5_model = build_f5_model(ckpt_file, VOCAB_FILE, device)
         logger.info("F5-TTS model loaded successfully.")
     except Exception as e:
-        logger.error(f"Failed to load F5-TTS model from {CKPT_FILE}: {e}")
+        logger.error(f"Failed to load F5-TTS model from {ckpt_file or DEFAULT_CKPT_REPO}: {e}")
         raise
 
+    # Fine-tuned models are loaded on first use and share the vocoder loaded below
+    model_registry = F5ModelRegistry(
+        voice_clone_model_list,
+        loader=load_registry_model,
+        device=device,
+        max_resident=MAX_RESIDENT_MODELS,
+        max_cpu=MAX_CPU_MODELS,
+        unavailable=unloadable_voice_models,
+    )
+
+    speaker_cache = SpeakerCache(process_reference, max_bytes=int(SPEAKER_CACHE_MB * 1024 * 1024), max_speakers=MAX_SPEAKERS)
+    synthesis_batcher = SynthesisBatcher(
+        synthesize_texts,
+        max_batch_size=SYNTH_MAX_BATCH_SIZE,
+        max_wait_ms=SYNTH_MAX_WAIT_MS,
+        max_batch_chars=SYNTH_MAX_BATCH_CHARS,
+    )
+    track_model("f5_base", f5_model)
+    track_cache("speaker", speaker_cache.stats)
+    QUEUE_DEPTH.set_function(synthesis_batcher.qsize, queue="synthesis")
+
     # --- Load Vocoder ---
     logger.info("Loading Vocoder...")
     try:
+        vocoder_dir = os.path.join(MODEL_SNAPSHOT_DIR, VOCODER_REPOS.get(mel_spec_type, ""))
+        is_local = mel_spec_type in VOCODER_REPOS and os.path.isdir(vocoder_dir)
         vocoder = load_vocoder(
             vocoder_name=mel_spec_type,
-            is_local=False,
-            local_path=None,
+            is_local=is_local,
+            local_path=vocoder_dir if is_local else None,
             device=device
         )
         vocoder.eval() # Set vocoder to evaluation mode
+        # Vocos is called through decode(), BigVGAN through forward()
+        time_method(vocoder, "decode" if mel_spec_type == "vocos" else "forward", "vocoder")
+        track_model("vocoder", vocoder)
         logger.info("Vocoder loaded successfully.")
     except Exception as e:
         logger.error(f"Failed to load vocoder ({mel_spec_type}): {e}")
         raise
 
     # --- (Optional but Recommended) Warm-up ---
+    if not WARMUP:
+        logger.info("Skipping warm-up (TTS_WARMUP=0)")
+    else:
+        warm_up()
+
+    tts_ready.set()
+    logger.info("--- TTS Resources Initialized ---")
+
+
+def warm_up():
+    """Runs one short synthesis so the first real request doesn't pay for lazy initialization."""
     logger.info("Warming up the models...")
     try:
         # Use a dummy reference audio included with the package for warm-up
@@ -157,11 +361,146 @@ def load_tts_resources():
     except Exception as e:
         logger.warning(f"Warm-up failed (continuing anyway): {e}")
 
-    logger.info("--- TTS Resources Initialized ---")
+
+def load_tts_resources_in_background():
+    """Loads the models in a daemon thread so the server answers health checks while it loads."""
+    def run():
+        global load_error
+        try:
+            load_tts_resources()
+        except Exception as e:
+            load_error = str(e)
+            logger.error(f"Failed to initialize TTS resources: {e}", exc_info=True)
+
+    threading.Thread(target=run, name="tts-loader", daemon=True).start()
 
 
 # --- Flask Application ---
 app = Flask(__name__)
+init_app(app, "f5_tts")
+
+def split_for_reference(ref_audio, ref_text, text):
+    """Splits text into pieces that fit in one generation next to the reference clip."""
+    # Same per-batch text budget as f5_tts's infer_process: what fits in ~22s alongside the reference
+    ref_seconds = ref_audio[0].shape[-1] / ref_audio[1]
+    max_chars = int(len(ref_text.encode("utf-8")) / ref_seconds * (22 - ref_seconds))
+    return chunk_text(text, max_chars=max(max_chars, 1))
+
+
+@contextmanager
+def submit_synthesis(speaker_id, model_name, texts):
+    """
+    Queues texts on the batcher and yields their futures. The model is loaded (and pinned) on the
+    calling request thread first, so a cold load of one fine-tune doesn't stall the single batcher
+    thread that serves every speaker and model.
+    """
+    with model_context(model_name):
+        yield [synthesis_batcher.submit(speaker_id, model_name, text) for text in texts]
+
+
+def synthesize_long(speaker_id, model_name, reference, text):
+    """
+    Synthesizes text of any length through the batcher: the pieces are queued together
+    (so they share inference calls) and joined with a cross-fade into one buffer.
+    """
+    pieces = split_for_reference((reference["audio"], reference["sr"]), reference["ref_text"], text)
+    with submit_synthesis(speaker_id, model_name, pieces) as futures:
+        return crossfade_join([future.result() for future in futures], sampling_rate, CROSSFADE_SECONDS)
+
+
+def parse_postprocess_options(data):
+    """Reads the optional sample_rate / normalize / trim_silence request fields."""
+    target_rate = data.get('sample_rate')
+    target_rate = int(target_rate) if target_rate else None
+    if target_rate is not None and not 8000 <= target_rate <= 48000:
+        raise ValueError("'sample_rate' must be between 8000 and 48000")
+    normalize = data.get('normalize')
+    if normalize is True:
+        normalize = DEFAULT_LOUDNESS_DBFS
+    elif normalize in (None, False):
+        normalize = None
+    else:
+        normalize = float(normalize)
+    return {"target_rate": target_rate, "normalize_dbfs": normalize, "trim": bool(data.get('trim_silence', False))}
+
+
+def stream_speech(model_scope, ref_audio, ref_text, text, output_format, chunk_size):
+    """Yields WAV-framed or raw PCM bytes as infer_batch_process produces audio chunks."""
+    # Splitting the text lets the first sentence be vocoded and sent before the rest is generated
+    texts_to_infer = split_for_reference(ref_audio, ref_text, text)
+
+    with model_scope as model:
+        chunks = (
+            audio_chunk for audio_chunk, _ in infer_batch_process(
+                ref_audio=ref_audio,
+                ref_text=ref_text,
+                texts_to_infer=texts_to_infer,
+                model=model,
+                vocoder=vocoder,
+                progress=False,
+                device=device,
+                streaming=True,
+                chunk_size=chunk_size,
+            )
+        )
+        yield from stream_encode(chunks, sampling_rate, output_format)
+    logger.info("Streaming synthesis complete.")
+
+
+def validate_ref_audio_path(ref_audio_path):
+    """Returns an error message if the reference audio path is unusable, otherwise None."""
+    # Basic security check: Ensure path doesn't try to escape expected directories
+    # In a real app, you'd likely have a dedicated upload folder or more robust path validation
+    if ".." in ref_audio_path or not os.path.isabs(ref_audio_path):
+         # Allowing relative paths might be okay if relative to a known, safe base directory
+         # For simplicity here, we require absolute paths or paths within the current working dir
+         if not os.path.exists(ref_audio_path):
+             return f"Invalid or non-existent reference audio path: {ref_audio_path}"
+    elif not os.path.exists(ref_audio_path):
+         return f"Reference audio file not found at: {ref_audio_path}"
+    return None
+
+
+@app.route('/speakers', methods=['POST'])
+def register_speaker():
+    """
+    Processes a reference clip once and returns a speaker id usable in /synthesize.
+    Expects JSON payload:
+    {
+        "ref_audio_path": "/path/to/reference/audio.wav",
+        "ref_text": "(Optional) Transcript of reference audio."
+    }
+    Returns JSON response:
+    {
+        "speaker_id": "...",
+        "ref_text": "Transcript used for the reference."
+    }
+    """
+    if not speaker_cache:
+        return jsonify({"error": "TTS Service not ready"}), 503
+
+    data = request.get_json(silent=True) or {}
+    ref_audio_path = data.get('ref_audio_path')
+    if not ref_audio_path:
+        return jsonify({"error": "Missing required field: 'ref_audio_path'"}), 400
+    error = validate_ref_audio_path(ref_audio_path)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        speaker_id, entry = speaker_cache.lookup(ref_audio_path, data.get('ref_text', ""))
+    except Exception as e:
+        logger.exception("Failed to register speaker")
+        return jsonify({"error": f"Failed to process reference audio: {str(e)}"}), 400
+    return jsonify({"speaker_id": speaker_id, "ref_text": entry["ref_text"]}), 200
+
+
+@app.route('/speakers', methods=['GET'])
+def speaker_cache_stats():
+    if not speaker_cache:
+        return jsonify({"error": "TTS Service not ready"}), 503
+    return jsonify(speaker_cache.stats()), 200
+
 
 @app.route('/synthesize', methods=['POST'])
 def synthesize_speech():
@@ -170,13 +509,25 @@ def synthesize_speech():
     Expects JSON payload:
     {
         "ref_audio_path": "/path/to/reference/audio.wav",
+        "speaker_id": "(Alternative to ref_audio_path) Id returned by /speakers.",
         "text_to_synthesize": "Text to speak.",
-        "ref_text": "(Optional) Transcript of reference audio."
+        "ref_text": "(Optional) Transcript of reference audio.",
+        "model": "(Optional) Key or language from voice_clone_model_list, e.g. 'hindi_futurix' or 'hindi'.",
+        "language": "(Optional) NLLB or ISO code used to pick the model when 'model' is not given.",
+        "output": "(Optional) 'path' (default), 'wav', 'pcm', 'flac' or 'ogg'.",
+        "stream": "(Optional) true to send audio chunks as they are generated (wav or pcm output).",
+        "chunk_size": "(Optional) Samples per streamed chunk.",
+        "sample_rate": "(Optional) Output sample rate, resampled from the model's rate.",
+        "normalize": "(Optional) true, or a target level in dBFS, to normalize loudness.",
+        "trim_silence": "(Optional) true to trim leading and trailing silence."
     }
-    Returns JSON response:
+    Returns JSON response for output 'path':
     {
         "output_path": "/path/to/temporary/output.wav"
     }
+    For 'wav', 'flac' and 'ogg' the body is the encoded file itself; for 'pcm' it is raw 16-bit
+    mono samples at the rate given in the X-Sample-Rate header. With stream=true the body is
+    sent chunked; sample_rate, normalize and trim_silence only apply to complete outputs.
     or
     {
         "error": "Error message"
@@ -196,83 +547,114 @@ def synthesize_speech():
             return jsonify({"error": "Invalid JSON payload"}), 400
 
         ref_audio_path = data.get('ref_audio_path')
+        speaker_id = data.get('speaker_id')
         text_to_synthesize = data.get('text_to_synthesize')
         ref_text = data.get('ref_text', "") # Optional reference text
-
-        if not ref_audio_path or not text_to_synthesize:
-            return jsonify({"error": "Missing required fields: 'ref_audio_path' and 'text_to_synthesize'"}), 400
-
-        # Basic security check: Ensure path doesn't try to escape expected directories
-        # In a real app, you'd likely have a dedicated upload folder or more robust path validation
-        if ".." in ref_audio_path or not os.path.isabs(ref_audio_path):
-             # Allowing relative paths might be okay if relative to a known, safe base directory
-             # For simplicity here, we require absolute paths or paths within the current working dir
-             if not os.path.exists(ref_audio_path):
-                 return jsonify({"error": f"Invalid or non-existent reference audio path: {ref_audio_path}"}), 400
-        elif not os.path.exists(ref_audio_path):
-             return jsonify({"error": f"Reference audio file not found at: {ref_audio_path}"}), 400
-
+        model_name = data.get('model') # Optional fine-tuned model, the base model is used otherwise
+        language = data.get('language')
+        output_format = data.get('output', "path")
+        stream = bool(data.get('stream', False))
+        chunk_size = int(data.get('chunk_size', STREAM_CHUNK_SIZE))
+        try:
+            options = parse_postprocess_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid post-processing option: {e}"}), 400
+
+        if output_format != "path" and output_format not in FORMATS:
+            return jsonify({"error": f"'output' must be one of 'path', {', '.join(repr(f) for f in FORMATS)}"}), 400
+        if stream and output_format == "path":
+            output_format = "wav" # A file path cannot be streamed
+        if stream and output_format not in STREAM_FORMATS:
+            return jsonify({"error": f"Only {' and '.join(STREAM_FORMATS)} output can be streamed"}), 400
+        if stream and (options["target_rate"] or options["normalize_dbfs"] is not None or options["trim"]):
+            return jsonify({"error": "'sample_rate', 'normalize' and 'trim_silence' need the complete audio and cannot be combined with 'stream'"}), 400
+
+        if not (ref_audio_path or speaker_id) or not text_to_synthesize:
+            return jsonify({"error": "Missing required fields: 'ref_audio_path' (or 'speaker_id') and 'text_to_synthesize'"}), 400
+        if not isinstance(text_to_synthesize, str) or not text_to_synthesize.strip():
+            return jsonify({"error": "'text_to_synthesize' must be a non-empty string"}), 400
+
+        if language and not model_name:
+            try:
+                model_name = LANGUAGES.f5_model(language)
+            except UnsupportedLanguage as e:
+                return jsonify({"error": str(e)}), 400
+        if model_name:
+            try:
+                model_registry.resolve(model_name)
+            except KeyError as e:
+                return jsonify({"error": str(e.args[0])}), 400
+
+        if not speaker_id:
+            error = validate_ref_audio_path(ref_audio_path)
+            if error:
+                return jsonify({"error": error}), 400
 
     except Exception as e:
         logger.error(f"Error parsing request data: {e}")
         return jsonify({"error": "Failed to parse request JSON"}), 400
 
-    logger.info(f"Received synthesis request: ref_audio='{ref_audio_path}', text='{text_to_synthesize[:50]}...'")
+    logger.info(f"Received synthesis request [trace {current_trace_id()}]: ref_audio='{speaker_id or ref_audio_path}', text='{text_to_synthesize[:50]}...'")
 
     try:
         # --- Process Reference Audio ---
-        logger.info("Processing reference audio...")
-        # preprocess_ref_audio_text handles transcription if ref_text is empty
-        # It might save a temporary processed version, manage that if needed
-        ref_audio_path_processed, ref_text_processed = preprocess_ref_audio_text(
-            ref_audio_path, ref_text
-        )
-        ref_audio_tensor, ref_audio_sr = torchaudio.load(ref_audio_path_processed)
-        ref_audio_tensor = ref_audio_tensor.to(device) # Move tensor to the target device
-        logger.info(f"Reference audio processed. Using text: '{ref_text_processed}'")
+        # Cached by content hash, so preprocessing/ASR/decoding only run for new speakers
+        try:
+            if speaker_id:
+                reference = speaker_cache.get(speaker_id)
+            else:
+                speaker_id, reference = speaker_cache.lookup(ref_audio_path, ref_text)
+        except KeyError as e:
+            return jsonify({"error": str(e.args[0])}), 404
+        ref_audio_tensor, ref_audio_sr = reference["audio"], reference["sr"]
+        ref_text_processed = reference["ref_text"]
+        logger.info(f"Reference audio ready for speaker {speaker_id}. Using text: '{ref_text_processed}'")
 
         # --- Synthesize Speech ---
         logger.info(f"Starting synthesis for text: '{text_to_synthesize}'")
-        audio_chunks = []
-        for audio_chunk, sr in infer_batch_process(
-            ref_audio=(ref_audio_tensor, ref_audio_sr),
-            ref_text=ref_text_processed,
-            texts_to_infer=[text_to_synthesize], # Pass text as a list
-            model=f5_model,
-            vocoder=vocoder,
-            progress=False, # Disable progress bar in API logs
-            device=device,
-            streaming=False, # Use streaming=True if you want to stream response (more complex)
-            chunk_size=2048,
-        ):
-            if audio_chunk is not None and len(audio_chunk) > 0:
-                audio_chunks.append(audio_chunk)
+        if stream:
+            chunks = stream_speech(
+                model_context(model_name), (ref_audio_tensor, ref_audio_sr), ref_text_processed,
+                text_to_synthesize, output_format, chunk_size,
+            )
+            return Response(
+                stream_with_context(chunks),
+                mimetype="audio/wav" if output_format == "wav" else "application/octet-stream",
+                headers={"X-Sample-Rate": str(sampling_rate)},
+            )
 
+        # Queued with other requests for the same speaker and model so they share inference calls
+        generated_audio = synthesize_long(speaker_id, model_name, reference, text_to_synthesize)
         logger.info("Synthesis complete.")
 
-        # Clean up reference tensor
+        # The reference tensor stays in the speaker cache for later requests
         del ref_audio_tensor
-        if device == 'cuda': torch.cuda.empty_cache()
-        elif device == 'xpu': torch.xpu.empty_cache()
-
 
-        if not audio_chunks:
+        if generated_audio is None or len(generated_audio) == 0:
             logger.error("Synthesis resulted in no audio chunks.")
             return jsonify({"error": "Failed to generate audio"}), 500
 
-        # Concatenate chunks
-        generated_audio = np.concatenate(audio_chunks)
         logger.info(f"Generated audio of length: {len(generated_audio)} samples")
 
+        # The joined buffer is owned by this request, so post-processing runs in place
+        with stage("postprocess"):
+            generated_audio, output_rate = postprocess(generated_audio, sampling_rate, **options)
+
+        # Clipped and converted to 16-bit PCM (or compressed) straight into the response body
+        with stage("wav_encode"):
+            body = encode(generated_audio, output_rate, "wav" if output_format == "path" else output_format)
+
+        if output_format != "path":
+            # Serve from memory so the caller doesn't need access to this server's filesystem
+            return Response(body, mimetype=MIMETYPES[output_format], headers={"X-Sample-Rate": str(output_rate)})
+
         # --- Save Output Audio to Temporary File ---
         # Create a temporary file that will be automatically cleaned up
         # Suffix ensures it's a .wav file
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
             output_path = tmp_file.name
             logger.info(f"Saving generated audio to temporary file: {output_path}")
-            # Convert float audio to int16 for standard WAV format
-            audio_int16 = np.int16(generated_audio * 32767)
-            scipy.io.wavfile.write(output_path, sampling_rate, audio_int16)
+            tmp_file.write(body)
 
         # Return the path to the temporary file
         return jsonify({"output_path": output_path}), 200
@@ -282,24 +664,124 @@ def synthesize_speech():
          return jsonify({"error": f"File not found: {e.filename}"}), 404
     except torchaudio.TorchaudioException as e:
         logger.error(f"Error loading reference audio with torchaudio: {e}")
-        return jsonify({"error": f"Failed to load reference audio: {ref_audio_path}. Ensure it's a valid audio file."}), 400
+        return jsonify({"error": f"Failed to load reference audio: {ref_audio_path or speaker_id}. Ensure it's a valid audio file."}), 400
     except Exception as e:
         logger.exception("An unexpected error occurred during synthesis") # Log full traceback
-        # Clean up reference tensor if it exists from a partial failure
-        if 'ref_audio_tensor' in locals() and ref_audio_tensor is not None:
-             del ref_audio_tensor
-             if device == 'cuda': torch.cuda.empty_cache()
-             elif device == 'xpu': torch.xpu.empty_cache()
+        # Release memory held by a partial failure (the cached reference itself is kept)
+        if device == 'cuda': torch.cuda.empty_cache()
+        elif device == 'xpu': torch.xpu.empty_cache()
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+
+@app.route('/synthesize_batch', methods=['POST'])
+def synthesize_speech_batch():
+    """
+    API endpoint to synthesize many texts with one reference speaker.
+    Expects JSON payload:
+    {
+        "ref_audio_path": "/path/to/reference/audio.wav",
+        "speaker_id": "(Alternative to ref_audio_path) Id returned by /speakers.",
+        "texts": ["First line.", "Second line."],
+        "ref_text": "(Optional) Transcript of reference audio.",
+        "model": "(Optional) Key or language from voice_clone_model_list.",
+        "language": "(Optional) NLLB or ISO code used to pick the model when 'model' is not given.",
+        "sample_rate", "normalize", "trim_silence": "(Optional) As for /synthesize, applied to every item."
+    }
+    Returns JSON response with one base64-encoded WAV per text, in order:
+    {
+        "speaker_id": "...",
+        "sample_rate": 24000,
+        "items": [{"index": 0, "audio_wav_base64": "..."}]
+    }
+    """
+    if not f5_model or not vocoder:
+        return jsonify({"error": "TTS Service not ready"}), 503
+
+    data = request.get_json(silent=True) or {}
+    ref_audio_path = data.get('ref_audio_path')
+    speaker_id = data.get('speaker_id')
+    texts = data.get('texts')
+    model_name = data.get('model')
+    try:
+        options = parse_postprocess_options(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid post-processing option: {e}"}), 400
+    if data.get('language') and not model_name:
+        try:
+            model_name = LANGUAGES.f5_model(data['language'])
+        except UnsupportedLanguage as e:
+            return jsonify({"error": str(e)}), 400
+
+    if not (ref_audio_path or speaker_id) or not isinstance(texts, list) or not texts:
+        return jsonify({"error": "Missing required fields: 'ref_audio_path' (or 'speaker_id') and a non-empty 'texts' list"}), 400
+    if not all(isinstance(text, str) and text.strip() for text in texts):
+        return jsonify({"error": "Every item of 'texts' must be a non-empty string"}), 400
+    if model_name:
+        try:
+            model_registry.resolve(model_name)
+        except KeyError as e:
+            return jsonify({"error": str(e.args[0])}), 400
+
+    try:
+        if not speaker_id:
+            error = validate_ref_audio_path(ref_audio_path)
+            if error:
+                return jsonify({"error": error}), 400
+            speaker_id = speaker_cache.register(ref_audio_path, data.get('ref_text', ""))
+        else:
+            speaker_cache.get(speaker_id)
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+
+    logger.info(f"Received batch synthesis request: speaker={speaker_id}, {len(texts)} text(s)")
+    try:
+        items = []
+        output_rate = options["target_rate"] or sampling_rate
+        with submit_synthesis(speaker_id, model_name, texts) as futures:
+            for index, future in enumerate(futures):
+                with stage("postprocess"):
+                    audio, output_rate = postprocess(future.result(), sampling_rate, **options)
+                with stage("wav_encode"):
+                    body = encode(audio, output_rate, "wav")
+                items.append({"index": index, "audio_wav_base64": base64.b64encode(body).decode("ascii")})
+        return jsonify({"speaker_id": speaker_id, "sample_rate": output_rate, "items": items}), 200
+    except KeyError as e:
+        # A fine-tune that turned out not to load
+        return jsonify({"error": str(e.args[0])}), 400
+    except Exception as e:
+        logger.exception("An unexpected error occurred during batch synthesis")
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
 
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: models are loaded and synthesis requests can be served."""
+    if tts_ready.is_set():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "failed" if load_error else "loading", "error": load_error}), 503
+
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Lists the voice clone models that can be requested and which are currently loaded."""
+    if not model_registry:
+        return jsonify({"error": "TTS Service not ready"}), 503
+    return jsonify({"models": model_registry.keys(), **model_registry.status()}), 200
+
+
 if __name__ == '__main__':
-    # Load models once before starting the server
+    # Load models once, in the background, while the server already answers /healthz and /readyz
     try:
-        load_tts_resources()
+        load_tts_resources_in_background()
         # Start Flask development server
         # In production, use a proper WSGI server like Gunicorn or uWSGI
-        app.run(host='0.0.0.0', port=5000, debug=False) # Turn debug=False for production
+        app.run(host='0.0.0.0', port=PORT, debug=False) # Turn debug=False for production
     except Exception as e:
          logger.error(f"Failed to initialize TTS resources or start server: {e}", exc_info=True)
          print(f"\nError during startup: {e}. Please check logs.\n")
@@ -0,0 +1,97 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class SynthesisBatcher:
+    """
+    Groups pending synthesis requests that share a reference speaker and model.
+
+    A single worker thread drains the queue, waiting at most `max_wait_ms` for more
+    requests. Requests for the same (speaker_id, model) are sorted by text length and
+    cut into batches of at most `max_batch_size` texts / `max_batch_chars` characters,
+    so every `synthesize_fn(speaker_id, model_name, texts)` call sees similar-length
+    texts. `synthesize_fn` must return one audio array per text, in order.
+    """
+
+    def __init__(self, synthesize_fn, max_batch_size=16, max_wait_ms=20, max_batch_chars=2000):
+        self.synthesize_fn = synthesize_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_chars = max_batch_chars
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="synthesis-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, speaker_id, model_name, text):
+        future = Future()
+        self._queue.put(((speaker_id, model_name), text, future))
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def synthesize(self, speaker_id, model_name, text):
+        return self.submit(speaker_id, model_name, text).result()
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return pending
+
+    def _batches(self, items):
+        """Length-sorted batches bounded by item count and total characters."""
+        batch, chars = [], 0
+        for item in sorted(items, key=lambda item: len(item[1])):
+            if batch and (len(batch) >= self.max_batch_size or chars + len(item[1]) > self.max_batch_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(item)
+            chars += len(item[1])
+        if batch:
+            yield batch
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[0], []).append(item)
+
+            for (speaker_id, model_name), items in groups.items():
+                # Any error fails this group's requests only; the worker thread must keep running
+                try:
+                    self._run_group(speaker_id, model_name, items)
+                except Exception as e:
+                    logger.exception(f"Synthesis batch for speaker {speaker_id} failed")
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _run_group(self, speaker_id, model_name, items):
+        for batch in self._batches(items):
+            logger.info(f"Synthesizing batch of {len(batch)} text(s) for speaker {speaker_id}")
+            try:
+                outputs = self.synthesize_fn(speaker_id, model_name, [text for _, text, _ in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"Expected {len(batch)} audio outputs from the batch, got {len(outputs)}")
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), audio in zip(batch, outputs):
+                future.set_result(audio)
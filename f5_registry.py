@@ -0,0 +1,248 @@
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint file extensions in order of preference
+CHECKPOINT_EXTENSIONS = (".safetensors", ".pt", ".pth", ".ckpt")
+
+# Local copies laid out as <MODEL_SNAPSHOT_DIR>/<repo_id>/<filename> are used before the hub
+MODEL_SNAPSHOT_DIR = os.environ.get("MODEL_SNAPSHOT_DIR", "model_snapshots")
+# Set to 1 to re-save pickled (.pt) checkpoints as safetensors in the snapshot dir so later loads are memory-mapped
+CONVERT_TO_SAFETENSORS = os.environ.get("TTS_CONVERT_TO_SAFETENSORS", "0") == "1"
+
+
+class IncompatibleCheckpoint(Exception):
+    """A voice clone model whose checkpoint can't be built with any of the configured F5-TTS architectures."""
+
+
+def hub_file(repo_id, filename):
+    """Path to a model file, from the local snapshot dir if present, otherwise downloaded from the hub."""
+    local = os.path.join(MODEL_SNAPSHOT_DIR, repo_id, filename)
+    if os.path.isfile(local):
+        return local
+
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(repo_id=repo_id, filename=filename)
+
+
+def list_model_files(repo_id):
+    local = os.path.join(MODEL_SNAPSHOT_DIR, repo_id)
+    if os.path.isdir(local):
+        return [
+            os.path.relpath(os.path.join(root, name), local)
+            for root, _, names in os.walk(local)
+            for name in names
+        ]
+
+    from huggingface_hub import HfApi
+    return HfApi().list_repo_files(repo_id)
+
+
+def convert_to_safetensors(repo_id, ckpt_path):
+    """
+    Saves the EMA weights of a pickled F5-TTS checkpoint as safetensors in the snapshot dir.
+    f5_tts's loader treats a .safetensors file as the EMA state dict, so the result loads the same way.
+    """
+    import torch
+    from safetensors.torch import save_file
+
+    target = os.path.join(MODEL_SNAPSHOT_DIR, repo_id, "model_converted.safetensors")
+    if os.path.isfile(target):
+        return target
+
+    checkpoint = torch.load(ckpt_path, map_location="cpu", weights_only=True)
+    state_dict = checkpoint.get("ema_model_state_dict", checkpoint.get("model_state_dict", checkpoint))
+    state_dict = {k: v.contiguous() for k, v in state_dict.items() if isinstance(v, torch.Tensor)}
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    save_file(state_dict, target)
+    logger.info(f"Converted {ckpt_path} to {target}")
+    return target
+
+
+def resolve_checkpoint(repo_id):
+    """
+    Finds and downloads the checkpoint (and vocab file, if any) of a fine-tuned F5-TTS repo.
+    Returns (ckpt_path, vocab_path) where vocab_path is "" when the repo ships no vocab.txt.
+    """
+    repo_files = list_model_files(repo_id)
+
+    ckpt_file = None
+    for ext in CHECKPOINT_EXTENSIONS:
+        candidates = sorted(f for f in repo_files if f.endswith(ext))
+        if candidates:
+            # Prefer files that look like model weights over optimizer states etc.
+            ckpt_file = next((f for f in candidates if "model" in f.lower()), candidates[0])
+            break
+    if ckpt_file is None:
+        raise FileNotFoundError(f"No checkpoint file found in Hugging Face repo '{repo_id}'")
+
+    vocab_file = next((f for f in repo_files if f.endswith("vocab.txt")), None)
+
+    ckpt_path = hub_file(repo_id, ckpt_file)
+    vocab_path = hub_file(repo_id, vocab_file) if vocab_file else ""
+    if CONVERT_TO_SAFETENSORS and not ckpt_path.endswith(".safetensors"):
+        ckpt_path = convert_to_safetensors(repo_id, ckpt_path)
+        if vocab_path:
+            # The snapshot dir now takes precedence for this repo, so it needs the vocab as well
+            local_vocab = os.path.join(MODEL_SNAPSHOT_DIR, repo_id, vocab_file)
+            if not os.path.isfile(local_vocab):
+                os.makedirs(os.path.dirname(local_vocab), exist_ok=True)
+                shutil.copyfile(vocab_path, local_vocab)
+            vocab_path = local_vocab
+    return ckpt_path, vocab_path
+
+
+class F5ModelRegistry:
+    """
+    Lazily loads the F5-TTS fine-tunes listed in `voice_clone_model_list`.
+
+    At most `max_resident` models stay on the inference device. The least recently
+    used one beyond that is moved to CPU memory, and beyond `max_cpu` models it is
+    dropped altogether (the checkpoint stays in the snapshot dir or Hugging Face
+    cache on disk and is reloaded on next use). All models share the single vocoder owned by the server.
+
+    Loads and moves between devices run outside the registry lock, so a cold load
+    only holds up the requests for that same model. Entries in `unavailable`
+    (key -> reason), and models whose loader raised IncompatibleCheckpoint, are
+    rejected by `resolve`.
+    """
+
+    def __init__(self, model_list, loader, device, max_resident=2, max_cpu=4, unavailable=None):
+        self.model_list = model_list
+        self.loader = loader  # loader(key, repo_id, device) -> model
+        self.device = device
+        self.max_resident = max_resident
+        self.max_cpu = max_cpu
+
+        self._unavailable = dict(unavailable or {})
+        self._resident = OrderedDict()  # key -> model on self.device
+        self._offloaded = OrderedDict()  # key -> model on cpu
+        self._in_use = {}
+        self._loading = {}  # key -> Event set once the load in progress finishes
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        """Maps a model key ('hindi_futurix') or a language ('hindi') to a loadable model key."""
+        name = name.strip().lower()
+        with self._lock:
+            unavailable = dict(self._unavailable)
+        if name in unavailable:
+            raise KeyError(f"Voice clone model '{name}' can't be loaded: {unavailable[name]}")
+        if name in self.model_list:
+            return name
+        for key in self.model_list:
+            if key.split("_")[0] == name and key not in unavailable:
+                return key
+        raise KeyError(f"No voice clone model registered for '{name}'")
+
+    def keys(self):
+        with self._lock:
+            return [key for key in self.model_list if key not in self._unavailable]
+
+    def status(self):
+        with self._lock:
+            return {
+                "resident": list(self._resident),
+                "offloaded": list(self._offloaded),
+                "loading": list(self._loading),
+                "unavailable": dict(self._unavailable),
+            }
+
+    @contextmanager
+    def use(self, name):
+        """Yields the model for `name` on the inference device and pins it there while in use."""
+        key = self.resolve(name)
+        model = self._acquire(key)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+                victims = self._pick_victims()
+            self._offload(victims)
+
+    def _acquire(self, key):
+        """Returns the model for `key` on the device, pinned; loads it first if needed."""
+        while True:
+            with self._lock:
+                if key in self._resident:
+                    self._resident.move_to_end(key)
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    return self._resident[key]
+                if key in self._unavailable:
+                    raise KeyError(f"Voice clone model '{key}' can't be loaded: {self._unavailable[key]}")
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    offloaded = self._offloaded.pop(key, None)
+                    break
+            # Another request is loading this model; use its result (or retry if it failed)
+            loading.wait()
+
+        try:
+            if offloaded is not None:
+                logger.info(f"Moving voice clone model '{key}' back to {self.device}")
+                model = offloaded.to(self.device)
+            else:
+                logger.info(f"Loading voice clone model '{key}' from {self.model_list[key]}")
+                model = self.loader(key, self.model_list[key], self.device)
+        except Exception as e:
+            with self._lock:
+                if isinstance(e, IncompatibleCheckpoint):
+                    logger.error(f"Voice clone model '{key}' can't be loaded: {e}")
+                    self._unavailable[key] = str(e)
+                del self._loading[key]
+            loading.set()
+            if isinstance(e, IncompatibleCheckpoint):
+                raise KeyError(f"Voice clone model '{key}' can't be loaded: {e}") from e
+            raise
+
+        with self._lock:
+            self._resident[key] = model
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            del self._loading[key]
+            victims = self._pick_victims()
+        loading.set()
+        self._offload(victims)
+        return model
+
+    def _pick_victims(self):
+        """
+        Takes the least recently used models beyond max_resident off the device list; called with
+        the lock held. They are marked as loading, so requests for them wait for `_offload`.
+        """
+        victims = []
+        # Models currently serving a request are skipped and evicted once released
+        for key in list(self._resident):
+            if len(self._resident) <= self.max_resident:
+                break
+            if key in self._in_use:
+                continue
+            victims.append((key, self._resident.pop(key), threading.Event()))
+            self._loading[key] = victims[-1][2]
+        return victims
+
+    def _offload(self, victims):
+        """Moves models picked by `_pick_victims` to CPU memory without holding the lock."""
+        for key, model, moved in victims:
+            logger.info(f"Offloading voice clone model '{key}' to cpu")
+            try:
+                model = model.to("cpu")
+            except Exception:
+                logger.exception(f"Failed to offload voice clone model '{key}', dropping it")
+                model = None
+            with self._lock:
+                if model is not None:
+                    self._offloaded[key] = model
+                del self._loading[key]
+                while len(self._offloaded) > self.max_cpu:
+                    dropped, _ = self._offloaded.popitem(last=False)
+                    logger.info(f"Dropping voice clone model '{dropped}' from memory")
+            moved.set()
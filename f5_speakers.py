@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+def hash_reference(ref_audio_path, ref_text=""):
+    """Content hash of a reference clip and its (optional) transcript, used as the speaker id."""
+    digest = hashlib.sha256()
+    with open(ref_audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(b"\0")
+    digest.update(ref_text.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class SpeakerCache:
+    """
+    LRU cache of processed reference audio keyed by speaker id.
+
+    Each entry holds the reference tensor already on the inference device, its
+    sample rate and the (possibly auto-transcribed) reference text, so repeat
+    requests skip preprocessing, ASR and audio decoding. Entries are evicted once
+    their tensors exceed `max_bytes` in total. Registered speakers remember their
+    source path, so an evicted entry is rebuilt transparently on next use; the
+    `max_speakers` most recently used sources are kept. Concurrent misses for one
+    speaker share a single processing run.
+    """
+
+    def __init__(self, process_fn, max_bytes, max_speakers=10000):
+        self.process_fn = process_fn  # process_fn(ref_audio_path, ref_text) -> (tensor, sr, ref_text)
+        self.max_bytes = max_bytes
+        self.max_speakers = max_speakers
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._sources = OrderedDict()  # speaker id -> (ref_audio_path, ref_text), least recently used first
+        self._pending = {}  # speaker id -> Future of the entry being processed
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def register(self, ref_audio_path, ref_text=""):
+        """Processes a reference clip (if not cached yet) and returns its speaker id."""
+        speaker_id, _ = self.lookup(ref_audio_path, ref_text)
+        return speaker_id
+
+    def lookup(self, ref_audio_path, ref_text=""):
+        """Returns (speaker_id, entry) for a reference clip, processing it on a miss."""
+        speaker_id = hash_reference(ref_audio_path, ref_text)
+        with self._lock:
+            self._sources[speaker_id] = (ref_audio_path, ref_text)
+            self._sources.move_to_end(speaker_id)
+            self._forget_old_sources()
+        return speaker_id, self.get(speaker_id)
+
+    def get(self, speaker_id):
+        return self._get(speaker_id, record=True)
+
+    def fetch(self, speaker_id):
+        """Like get(), without counting a hit or miss, for reads of a speaker a request already looked up."""
+        return self._get(speaker_id, record=False)
+
+    def _get(self, speaker_id, record):
+        with self._lock:
+            entry = self._entries.get(speaker_id)
+            if entry is not None:
+                self._entries.move_to_end(speaker_id)
+                self._sources.move_to_end(speaker_id)
+                if record:
+                    self.hits += 1
+                return entry
+            pending = self._pending.get(speaker_id)
+            if pending is None:
+                if speaker_id not in self._sources:
+                    raise KeyError(f"Unknown speaker id '{speaker_id}'")
+                ref_audio_path, ref_text = self._sources[speaker_id]
+                self._sources.move_to_end(speaker_id)
+                self._pending[speaker_id] = future = Future()
+                if record:
+                    self.misses += 1
+            elif record:
+                # Another request is already processing this speaker; it waits for that result
+                self.hits += 1
+        if pending is not None:
+            return pending.result()
+
+        try:
+            logger.info(f"Processing reference audio for speaker {speaker_id}")
+            audio, sr, processed_text = self.process_fn(ref_audio_path, ref_text)
+            entry = {
+                "audio": audio,
+                "sr": sr,
+                "ref_text": processed_text,
+                "nbytes": audio.element_size() * audio.nelement(),
+            }
+        except BaseException as e:
+            with self._lock:
+                del self._pending[speaker_id]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._pending[speaker_id]
+            if speaker_id not in self._entries and speaker_id in self._sources:
+                self._entries[speaker_id] = entry
+                self._bytes += entry["nbytes"]
+                self._evict()
+        future.set_result(entry)
+        return entry
+
+    def _forget_old_sources(self):
+        while len(self._sources) > self.max_speakers:
+            speaker_id, _ = self._sources.popitem(last=False)
+            entry = self._entries.pop(speaker_id, None)
+            if entry is not None:
+                self._bytes -= entry["nbytes"]
+            logger.info(f"Forgot speaker {speaker_id}, the least recently used of {self.max_speakers}")
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the cap
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            speaker_id, entry = self._entries.popitem(last=False)
+            self._bytes -= entry["nbytes"]
+            logger.info(f"Evicted speaker {speaker_id} from the reference cache")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "speakers": len(self._sources),
+                "cached": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
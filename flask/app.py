@@ -1,6 +1,13 @@
-from flask import request, jsonify, Flask
-from main import SpeechToTranslate
+from flask import request, jsonify, Flask, Response, stream_with_context
+from sessions import SessionStore
+from cache import TranslationCache
+from instrumentation import init_app, trace_headers, track_cache, track_model, stage, QUEUE_DEPTH
+from audio_output import decode_wav
+from languages import LANGUAGES, UnsupportedLanguage
+import threading
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
 from pydub import AudioSegment
 from pydub.playback import play
 import os
@@ -8,8 +15,98 @@ from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
+init_app(app, "translate")
 
-s2t = SpeechToTranslate(input_lang="en", output_lang="hin_Deva")
+TTS_SERVER_URL = os.environ.get("TTS_SERVER_URL", "http://127.0.0.1:8000")
+# F5-TTS server (f5-tts.py, port F5_PORT), used for languages XTTS cannot speak
+F5_SERVER_URL = os.environ.get("F5_SERVER_URL", "http://127.0.0.1:5002")
+
+# Keep-alive connections to the TTS server, shared by all request threads
+tts_session = requests.Session()
+tts_session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=int(os.environ.get("TTS_POOL_SIZE", "8"))))
+
+DEFAULT_OUTPUT_LANG = "hin_Deva"
+
+cache = TranslationCache()
+track_cache("translation", cache.stats)
+sessions = SessionStore(default_output_lang=DEFAULT_OUTPUT_LANG)
+
+# Filled in by load_translator() in the background so the server answers health checks immediately
+s2t = None
+batcher = None
+streamer = None
+translator_ready = threading.Event()
+load_error = None
+
+
+def load_translator():
+    global s2t, batcher, streamer, load_error
+    try:
+        # Imported here so torch/transformers load off the startup path
+        from main import SpeechToTranslate
+        from batcher import TranslationBatcher
+        from streaming import StreamingTranslator
+        from replicas import TranslationPool, REPLICAS
+
+        if REPLICAS > 1:
+            # Replica processes share the weights; one batcher thread per replica keeps them all busy
+            s2t = TranslationPool(replicas=REPLICAS)
+            batcher = TranslationBatcher(s2t, cache=cache, num_workers=s2t.size)
+        else:
+            s2t = SpeechToTranslate(input_lang="en", output_lang=DEFAULT_OUTPUT_LANG)
+            batcher = TranslationBatcher(s2t, cache=cache)
+            track_model("nllb", s2t.translation_model)
+        streamer = StreamingTranslator(batcher)
+        QUEUE_DEPTH.set_function(batcher.qsize, queue="translate")
+        translator_ready.set()
+    except Exception as e:
+        load_error = str(e)
+        print(f"Failed to load translation model: {e}")
+
+
+threading.Thread(target=load_translator, name="translator-loader", daemon=True).start()
+
+# Endpoints that work before the model has loaded
+NO_MODEL_ENDPOINTS = {"welcome", "healthz", "readyz", "metrics", "languages", "start", "get_translated_text", "cache_stats", "generate_tts", "static"}
+
+
+@app.before_request
+def require_model():
+    if request.endpoint not in NO_MODEL_ENDPOINTS and not translator_ready.is_set():
+        return jsonify({"error": "Translation model is not loaded yet", "details": load_error}), 503
+
+@app.errorhandler(UnsupportedLanguage)
+def unsupported_language(e):
+    return jsonify({"error": str(e)}), 400
+
+
+def request_languages(data, session):
+    """(input, output) NLLB codes for a request: call fields win over the session's, both validated."""
+    input_lang = data.get('sourceLanguage') or session["input_lang"]
+    output_lang = data.get('targetLanguage') or session["output_lang"]
+    return s2t.languages.nllb(input_lang) if input_lang else None, s2t.languages.nllb(output_lang)
+
+# Clients that don't send a session id (the current frontend) share one session
+DEFAULT_SESSION_ID = "default"
+
+
+def get_session_id(data=None, default=DEFAULT_SESSION_ID):
+    data = data or {}
+    return (
+        data.get('sessionId')
+        or request.args.get('sessionId')
+        or request.headers.get('X-Session-Id')
+        or default
+    )
+
+
+def last_event_id():
+    """The SSE id a reconnecting EventSource last received, or None."""
+    value = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
 
 @app.route("/")
 def welcome():
@@ -18,47 +115,135 @@ def welcome():
         'message': 'Server of "NLLB language translator" is up and running successfully'
     }
 
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz")
+def readyz():
+    if translator_ready.is_set():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "failed" if load_error else "loading", "error": load_error}), 503
+
+@app.route("/languages")
+def languages():
+    return jsonify(LANGUAGES.describe()), 200
+
 @app.route("/start", methods=["POST"])
 def start():
-    data = request.get_json()
+    data = request.get_json() or {}
+    session_id = get_session_id(data)
+
+    input_lang = data.get('inputLanguage')
+    session = sessions.update(
+        session_id,
+        input_lang=LANGUAGES.nllb(input_lang) if input_lang else None,
+        output_lang=LANGUAGES.nllb(data.get('outputLanguage') or DEFAULT_OUTPUT_LANG),
+    )
 
-    # s2t.input_lang = data.get('inputLanguage')
-    s2t.output_lang = data.get('outputLanguage')
-    
-    return jsonify({"success": True, "output language": s2t.output_lang}), 200
+    return jsonify({"success": True, "output language": session["output_lang"], "session_id": session_id}), 200
 
 
 @app.route("/translate", methods=["POST"])
 def translation():
-    transcription = request.get_json()
-    transcription = transcription.get('text')
-    translation = s2t.translate(transcription)
-    
-    return jsonify({"translated_text": translation}, 200)
+    data = request.get_json() or {}
+    transcription = data.get('text')
+    if not transcription:
+        return jsonify({"error": "Missing required field: 'text'"}), 400
+
+    # Languages given on the call win over the ones stored for the session
+    session_id = get_session_id(data)
+    input_lang, output_lang = request_languages(data, sessions.get(session_id))
+
+    translation = batcher.translate(transcription, output_lang, input_lang)
+    # A per-call targetLanguage doesn't change the language configured with /start
+    sessions.update(session_id, translated_text=translation, translated_lang=output_lang)
+
+    return jsonify({"translated_text": translation, "language": output_lang, "session_id": session_id}, 200)
 
 
 @app.route("/getTranslatedText", methods=["GET"])
 def get_translated_text():
-    print({"translated_text": s2t.translated_text, "language": s2t.output_lang})
     try:
-        return jsonify({"translated_text": s2t.translated_text, "language": s2t.output_lang}), 200
+        session = sessions.get(get_session_id())
+        language = session["translated_lang"] or session["output_lang"]
+        return jsonify({"translated_text": session["translated_text"], "language": language}), 200
     except Exception as e:
         return {"error": "Internal server error", "details": str(e)}, 500
 
+@app.route("/translateStream", methods=["POST"])
+def feed_translation_stream():
+    data = request.get_json() or {}
+    # Streams are never shared: a client without a session id gets a new one to read its events with
+    session_id = get_session_id(data, default=None) or uuid.uuid4().hex
+    input_lang, output_lang = request_languages(data, sessions.get(session_id))
+
+    queued = streamer.feed(session_id, data.get('text', ''), output_lang, input_lang, final=bool(data.get('final')))
+    return jsonify({"queued": queued, "session_id": session_id}), 202
+
+
+@app.route("/translateStream", methods=["GET"])
+def translation_stream():
+    session_id = get_session_id(default=None)
+    if not session_id:
+        return jsonify({"error": "Missing 'sessionId' (returned by POST /translateStream)"}), 400
+    # Comment lines every 15s keep proxies from closing an idle stream
+    events = streamer.events(session_id, timeout=15, last_event_id=last_event_id())
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/translateTokens", methods=["POST"])
+def translation_tokens():
+    data = request.get_json() or {}
+    text = data.get('text')
+    if not text:
+        return jsonify({"error": "Missing required field: 'text'"}), 400
+    input_lang, output_lang = request_languages(data, sessions.get(get_session_id(data)))
+
+    # Bypasses the batcher: one sentence decoded token by token, sent as chunked text
+    pieces = s2t.translate_stream(text, output_lang, input_lang)
+    return Response(stream_with_context(pieces), mimetype="text/plain; charset=utf-8")
+
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(cache.stats()), 200
+
 @app.route('/tts', methods=['POST'])
 def generate_tts():
     response = request.get_json()
     input_text = response.get("translated_text")
-    langauge = response.get("language")
+    language = response.get("language") or DEFAULT_OUTPUT_LANG
     audio_url = response.get("audio_url")
     print(f"Received data: {response}")
+    # Unsupported languages are rejected here, before either TTS server does any work
+    engine, tts_language = LANGUAGES.tts_route(language)
     try:
-        response = requests.post("http://127.0.0.0:8000/tts", json={"input": input_text, "language": langauge, "audio_url": audio_url})
-        print(f"TTS API response: {response.status_code}, {response.text}")
+        # Audio comes back in the response body, so the services don't need a shared filesystem
+        if engine == "xtts":
+            response = tts_session.post(
+                f"{TTS_SERVER_URL}/tts",
+                json={"input": input_text, "language": tts_language, "audio_url": audio_url, "output": "wav"},
+                headers=trace_headers(),
+            )
+        else:
+            # tts_language is the F5 fine-tune for the language (None for the base model)
+            response = tts_session.post(
+                f"{F5_SERVER_URL}/synthesize",
+                json={"text_to_synthesize": input_text, "ref_audio_path": audio_url, "model": tts_language, "output": "wav"},
+                headers=trace_headers(),
+            )
+        print(f"TTS API response: {response.status_code}, {len(response.content)} bytes")
         if response.status_code == 200:
-            audio = AudioSegment.from_wav("../cloning/output.wav")
+            with stage("wav_decode"):
+                # Wraps the response's samples directly instead of parsing the WAV through pydub/ffmpeg
+                samples, sample_rate, channels = decode_wav(response.content)
+                audio = AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=sample_rate, channels=channels)
             play(audio)
-            os.remove(f"saved_audio_files/audio.wav")
             return jsonify({"message": "TTS generation complete"}), 200
         else:
             return jsonify({"error": "TTS generation failed", "details": response.text}), 500
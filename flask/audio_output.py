@@ -0,0 +1,225 @@
+"""
+Post-processing and encoding of synthesized audio, shared by the TTS servers and the pipeline.
+
+Float audio comes in as a 1-D float32 array in [-1, 1]. The helpers work in place
+where they can and write into preallocated buffers, so a long output is not copied
+once per step (list of chunks -> concatenate -> scale -> cast -> WAV writer).
+
+    audio, rate = postprocess(audio, 24000, target_rate=16000, normalize_dbfs=-20, trim=True)
+    body = encode(audio, rate, "wav")
+"""
+import io
+import math
+import struct
+import wave
+
+import numpy as np
+
+FORMATS = ("wav", "pcm", "flac", "ogg")
+# Formats that can be sent chunk by chunk as audio is generated
+STREAM_FORMATS = ("wav", "pcm")
+MIMETYPES = {
+    "wav": "audio/wav",
+    "pcm": "application/octet-stream",
+    "flac": "audio/flac",
+    "ogg": "audio/ogg",
+}
+WAV_HEADER_SIZE = 44
+
+
+def as_float32(audio):
+    """A 1-D float32 array of `audio` (numpy array, torch tensor or list), copying only when needed."""
+    if hasattr(audio, "detach"):
+        audio = audio.detach().cpu().numpy()
+    return np.asarray(audio, dtype=np.float32).reshape(-1)
+
+
+def to_int16(audio, out=None):
+    """
+    Converts float audio in [-1, 1] to int16 PCM with clipping and rounding.
+    Uses one float32 scratch buffer; pass `out` (an int16 array of the same length) to
+    write the samples into a caller-owned buffer, e.g. the data section of a WAV body.
+    """
+    scaled = np.multiply(as_float32(audio), 32767.0, dtype=np.float32)
+    np.clip(scaled, -32768.0, 32767.0, out=scaled)
+    np.rint(scaled, out=scaled)
+    if out is None:
+        return scaled.astype(np.int16)
+    np.copyto(out, scaled, casting="unsafe")
+    return out
+
+
+def wav_header(sample_rate, num_samples=None, channels=1, bits_per_sample=16):
+    """
+    Builds a 44-byte PCM WAV header. With num_samples=None the size fields are set to
+    the maximum value, which players treat as "read until the stream ends".
+    """
+    block_align = channels * bits_per_sample // 8
+    data_size = 0xFFFFFFFF - 36 if num_samples is None else num_samples * block_align
+    return b"RIFF" + struct.pack("<I", data_size + 36) + b"WAVE" + struct.pack(
+        "<4sIHHIIHH4sI",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_size,
+    )
+
+
+def encode_wav(audio, sample_rate):
+    """16-bit mono WAV bytes, with the samples converted straight into the body buffer."""
+    audio = as_float32(audio)
+    body = bytearray(WAV_HEADER_SIZE + audio.size * 2)
+    body[:WAV_HEADER_SIZE] = wav_header(sample_rate, audio.size)
+    to_int16(audio, out=np.frombuffer(body, dtype="<i2", offset=WAV_HEADER_SIZE))
+    return bytes(body)
+
+
+def encode(audio, sample_rate, fmt="wav"):
+    """Encodes complete audio as 'wav', 'pcm' (raw 16-bit mono), 'flac' or 'ogg' (Vorbis)."""
+    if fmt == "wav":
+        return encode_wav(audio, sample_rate)
+    if fmt == "pcm":
+        return to_int16(audio).tobytes()
+    if fmt in ("flac", "ogg"):
+        try:
+            import soundfile
+        except ImportError:
+            raise ImportError(f"Encoding {fmt} needs soundfile: pip install soundfile")
+        buffer = io.BytesIO()
+        soundfile.write(buffer, as_float32(audio), sample_rate, format=fmt.upper())
+        return buffer.getvalue()
+    raise ValueError(f"Unknown audio format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def stream_encode(chunks, sample_rate, fmt="wav"):
+    """Yields 'wav' (header with open-ended size, then samples) or 'pcm' bytes as float chunks arrive."""
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Format '{fmt}' cannot be streamed, expected one of {', '.join(STREAM_FORMATS)}")
+    if fmt == "wav":
+        yield wav_header(sample_rate)
+    for chunk in chunks:
+        if chunk is not None and len(chunk) > 0:
+            yield to_int16(chunk).tobytes()
+
+
+def decode_wav(data):
+    """Returns (int16 samples, sample_rate, channels) of 16-bit WAV bytes without copying the samples."""
+    with wave.open(io.BytesIO(data), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"Expected 16-bit WAV, got {8 * f.getsampwidth()}-bit")
+        sample_rate, channels, frames = f.getframerate(), f.getnchannels(), f.getnframes()
+    samples = np.frombuffer(data, dtype="<i2", count=frames * channels, offset=data_offset(data))
+    return samples, sample_rate, channels
+
+
+def data_offset(data):
+    """Byte offset of the samples in WAV bytes, found by walking the RIFF chunks (LIST, fact, ... may precede data)."""
+    pos = 12  # "RIFF", size, "WAVE"
+    while pos + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, pos)
+        if chunk_id == b"data":
+            return pos + 8
+        pos += 8 + size + (size & 1)  # Chunks are padded to an even size
+    raise ValueError("WAV data has no data chunk")
+
+
+def clip(audio):
+    """Clips float audio to [-1, 1] in place."""
+    return np.clip(audio, -1.0, 1.0, out=audio)
+
+
+def frame_rms_db(audio, sample_rate, frame_ms=10):
+    """RMS level in dBFS of consecutive `frame_ms` frames (a trailing partial frame is dropped)."""
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    frames = audio[:audio.size - audio.size % frame].reshape(-1, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    return 10 * np.log10(np.maximum(power, 1e-12))
+
+
+def normalize_loudness(audio, sample_rate, target_dbfs=-20.0, gate_dbfs=-50.0, max_gain_db=20.0):
+    """
+    Scales audio in place so its speech level reaches `target_dbfs`.
+    The level is the RMS of frames above `gate_dbfs`, so pauses don't pull it down, and
+    the gain is capped so the loudest sample stays below full scale instead of clipping.
+    """
+    levels = frame_rms_db(audio, sample_rate)
+    active = levels[levels > gate_dbfs]
+    if active.size == 0:
+        return audio
+    # Mean power of the active frames, back in dB
+    level = 10 * math.log10(float(np.mean(np.power(10.0, active / 10))))
+    gain = 10 ** (min(target_dbfs - level, max_gain_db) / 20)
+    peak = float(np.max(np.abs(audio)))
+    if peak > 0:
+        gain = min(gain, 0.99 / peak)
+    audio *= np.float32(gain)
+    return audio
+
+
+def trim_silence(audio, sample_rate, threshold_dbfs=-45.0, keep_ms=50, frame_ms=10):
+    """Returns a view of `audio` without leading/trailing silence, keeping `keep_ms` of margin."""
+    levels = frame_rms_db(audio, sample_rate, frame_ms)
+    loud = np.flatnonzero(levels > threshold_dbfs)
+    if loud.size == 0:
+        return audio[:0]
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    keep = int(sample_rate * keep_ms / 1000)
+    start = max(0, loud[0] * frame - keep)
+    end = min(audio.size, (loud[-1] + 1) * frame + keep)
+    return audio[start:end]
+
+
+def resample(audio, orig_rate, target_rate):
+    """Polyphase resampling to `target_rate` (a no-op when the rates match)."""
+    if orig_rate == target_rate:
+        return audio
+    from scipy.signal import resample_poly
+
+    divisor = math.gcd(orig_rate, target_rate)
+    return resample_poly(audio, target_rate // divisor, orig_rate // divisor).astype(np.float32, copy=False)
+
+
+def crossfade_join(chunks, sample_rate, crossfade_seconds=0.15, out=None):
+    """
+    Joins float chunks into one preallocated array, overlapping neighbours by an
+    equal-power cross-fade of `crossfade_seconds` (shortened to fit short chunks).
+    """
+    chunks = [as_float32(chunk) for chunk in chunks if chunk is not None and len(chunk) > 0]
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    if len(chunks) == 1 and out is None:
+        return chunks[0]
+    fade = int(crossfade_seconds * sample_rate)
+    overlaps = [min(fade, prev.size, nxt.size) for prev, nxt in zip(chunks, chunks[1:])]
+    total = sum(chunk.size for chunk in chunks) - sum(overlaps)
+    if out is None:
+        out = np.empty(total, dtype=np.float32)
+
+    out[:chunks[0].size] = chunks[0]
+    pos = chunks[0].size
+    for chunk, overlap in zip(chunks[1:], overlaps):
+        start = pos - overlap
+        if overlap:
+            t = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+            region = out[start:pos]
+            region *= np.cos(t)
+            region += chunk[:overlap] * np.sin(t)
+        out[pos:start + chunk.size] = chunk[overlap:]
+        pos = start + chunk.size
+    return out[:pos]
+
+
+def postprocess(audio, sample_rate, target_rate=None, normalize_dbfs=None, trim=False):
+    """
+    Applies silence trimming, loudness normalization, resampling and clipping, in that order.
+    `audio` is modified in place when it is already a float32 array. Returns (audio, sample_rate).
+    """
+    audio = as_float32(audio)
+    if trim:
+        audio = trim_silence(audio, sample_rate)
+    if normalize_dbfs is not None and audio.size:
+        normalize_loudness(audio, sample_rate, normalize_dbfs)
+    if target_rate and target_rate != sample_rate:
+        audio = resample(audio, sample_rate, target_rate)
+        sample_rate = target_rate
+    if not audio.flags.writeable:
+        audio = audio.copy()
+    return clip(audio), sample_rate
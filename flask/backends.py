@@ -0,0 +1,124 @@
+import logging
+import os
+import shutil
+import tempfile
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+logger = logging.getLogger(__name__)
+
+MODEL_ID = os.environ.get("TRANSLATE_MODEL_ID", "facebook/nllb-200-distilled-600M")
+# One of: "torch" (eager fp32), "torch_int8" (dynamic int8 quantization, CPU only), "onnx" (ONNX Runtime via optimum)
+BACKEND = os.environ.get("TRANSLATE_BACKEND", "torch")
+# "auto" picks cuda when available, otherwise cpu
+DEVICE = os.environ.get("TRANSLATE_DEVICE", "auto")
+
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+# Local model snapshots are checked before the Hugging Face hub, so servers can start offline
+MODEL_SNAPSHOT_DIR = os.environ.get("MODEL_SNAPSHOT_DIR", "model_snapshots")
+# Set to 1 to save a downloaded (or exported) model as safetensors into MODEL_SNAPSHOT_DIR for the next start
+SAVE_SNAPSHOT = os.environ.get("SAVE_MODEL_SNAPSHOT", "0") == "1"
+
+
+def resolve_device(device=DEVICE):
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+
+def snapshot_path(model_id, variant=""):
+    return os.path.join(MODEL_SNAPSHOT_DIR, model_id + (f"-{variant}" if variant else ""))
+
+
+def has_snapshot(path):
+    return os.path.isfile(os.path.join(path, "config.json"))
+
+
+def save_snapshot(save, path, marker="config.json"):
+    """Calls save(dir) on a scratch dir and moves the files into `path`, the marker file last,
+    so a reader never takes a half-written snapshot for a complete one."""
+    os.makedirs(MODEL_SNAPSHOT_DIR, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=MODEL_SNAPSHOT_DIR, prefix=".partial-")
+    try:
+        save(scratch)
+        os.makedirs(path, exist_ok=True)
+        for name in sorted(os.listdir(scratch), key=lambda name: name == marker):
+            os.replace(os.path.join(scratch, name), os.path.join(path, name))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def load_seq2seq(model_id):
+    """Loads the eager model from a local safetensors snapshot when present, else from the hub."""
+    local = snapshot_path(model_id)
+    if has_snapshot(local):
+        logger.info(f"Loading {model_id} from snapshot {local}")
+        # safetensors are memory-mapped, and low_cpu_mem_usage skips the random-init copy
+        return AutoModelForSeq2SeqLM.from_pretrained(local, low_cpu_mem_usage=True)
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_id, low_cpu_mem_usage=True)
+    if SAVE_SNAPSHOT:
+        logger.info(f"Saving {model_id} snapshot to {local}")
+        save_snapshot(lambda path: model.save_pretrained(path, safe_serialization=True), local)
+    return model
+
+
+def load_tokenizer(model_id):
+    local = snapshot_path(model_id)
+    if os.path.isfile(os.path.join(local, "tokenizer_config.json")):
+        return AutoTokenizer.from_pretrained(local)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if SAVE_SNAPSHOT:
+        save_snapshot(tokenizer.save_pretrained, local, marker="tokenizer_config.json")
+    return tokenizer
+
+
+def load_torch(model_id, device):
+    model = load_seq2seq(model_id)
+    return model.to(device).eval()
+
+
+def load_torch_int8(model_id, device):
+    if device != "cpu":
+        raise ValueError("The torch_int8 backend only runs on cpu, got device '%s'" % device)
+    model = load_seq2seq(model_id).eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_onnx(model_id, device):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise ImportError("The onnx backend needs optimum with onnxruntime: pip install 'optimum[onnxruntime]'")
+
+    provider = "CUDAExecutionProvider" if device == "cuda" else "CPUExecutionProvider"
+    local = snapshot_path(model_id, "onnx")
+    if has_snapshot(local):
+        return ORTModelForSeq2SeqLM.from_pretrained(local, use_cache=True, provider=provider)
+
+    # use_cache exports a decoder-with-past graph so generation reuses the KV cache
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_id, export=True, use_cache=True, provider=provider)
+    if SAVE_SNAPSHOT:
+        # The export takes minutes, so keep it for the next start
+        save_snapshot(model.save_pretrained, local)
+    return model
+
+
+LOADERS = {
+    "torch": load_torch,
+    "torch_int8": load_torch_int8,
+    "onnx": load_onnx,
+}
+
+
+def load_translation_model(model_id=MODEL_ID, backend=BACKEND, device=DEVICE):
+    """Returns (tokenizer, model, device) for the configured inference backend."""
+    if backend not in LOADERS:
+        raise ValueError("Unknown translation backend '%s', expected one of %s" % (backend, ", ".join(BACKENDS)))
+
+    device = resolve_device(device)
+    tokenizer = load_tokenizer(model_id)
+    model = LOADERS[backend](model_id, device)
+    return tokenizer, model, device
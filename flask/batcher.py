@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from main import DEFAULT_SOURCE_LANG
+from segment import segment_text, join_segments
+
+
+MAX_BATCH_SIZE = int(os.environ.get("TRANSLATE_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.environ.get("TRANSLATE_MAX_WAIT_MS", "10"))
+
+
+class TranslationBatcher:
+    """Gathers concurrent translate calls into padded NLLB batches.
+
+    Requests are queued and a single worker thread drains the queue, waiting at
+    most `max_wait_ms` for more requests to arrive. Collected requests are
+    grouped by language pair so each group runs as one `generate()` call.
+    With a `cache`, hits are answered in `submit` without touching the queue.
+    With `num_workers` > 1 several batches run at once, for a TranslationPool
+    that serves them on separate replicas.
+    """
+
+    def __init__(self, s2t, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, cache=None, num_workers=1):
+        self.s2t = s2t
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"translation-batcher-{i}", daemon=True) for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, text, output_lang, input_lang=None):
+        future = Future()
+        if self.cache is not None:
+            cached = self.cache.get(text, input_lang or DEFAULT_SOURCE_LANG, output_lang)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+        self._queue.put((text, (input_lang, output_lang), future))
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def translate(self, text, output_lang, input_lang=None):
+        # Long transcripts are split into sentences that are batched (and cached) individually
+        segments, separators = segment_text(text)
+        futures = [self.submit(segment, output_lang, input_lang) for segment in segments]
+        return join_segments([future.result() for future in futures], separators, output_lang)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[1], []).append(item)
+
+            for (input_lang, output_lang), items in groups.items():
+                futures = [future for _, _, future in items]
+                try:
+                    outputs = self.s2t.translate_batch([text for text, _, _ in items], output_lang, input_lang)
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                for future, output in zip(futures, outputs):
+                    future.set_result(output)
+                # Written after the futures are resolved so callers don't wait on the sqlite write
+                if self.cache is not None:
+                    source_lang = input_lang or DEFAULT_SOURCE_LANG
+                    self.cache.put_many(
+                        (text, source_lang, output_lang, output) for (text, _, _), output in zip(items, outputs)
+                    )
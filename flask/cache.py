@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+CACHE_MAX_ENTRIES = int(os.environ.get("TRANSLATE_CACHE_SIZE", "10000"))
+CACHE_PATH = os.environ.get("TRANSLATE_CACHE_PATH", "")  # Empty keeps the cache in memory only
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TranslationCache:
+    """Bounded LRU cache of translations keyed by (text, src_lang, tgt_lang).
+
+    When `path` is set new entries are also written to a sqlite file, and the
+    most recently stored entries are loaded back on startup so a restarted
+    worker starts warm. The sqlite writes take their own lock, so a slow disk
+    sync never holds up `get()` on the request threads.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, path=CACHE_PATH):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL with synchronous=NORMAL syncs at checkpoints instead of on every commit
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text TEXT, src_lang TEXT, tgt_lang TEXT, translation TEXT, "
+            "PRIMARY KEY (text, src_lang, tgt_lang))"
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT text, src_lang, tgt_lang, translation FROM translations ORDER BY rowid DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for text, src_lang, tgt_lang, translation in reversed(rows):
+            self._entries[(text, src_lang, tgt_lang)] = translation
+
+    def get(self, text, src_lang, tgt_lang):
+        key = (normalize_text(text), src_lang, tgt_lang)
+        with self._lock:
+            translation = self._entries.get(key)
+            if translation is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return translation
+
+    def put(self, text, src_lang, tgt_lang, translation):
+        self.put_many([(text, src_lang, tgt_lang, translation)])
+
+    def put_many(self, entries):
+        """Stores (text, src_lang, tgt_lang, translation) tuples, written to sqlite in one transaction."""
+        rows = [(normalize_text(text), src_lang, tgt_lang, translation) for text, src_lang, tgt_lang, translation in entries]
+        with self._lock:
+            for text, src_lang, tgt_lang, translation in rows:
+                key = (text, src_lang, tgt_lang)
+                self._entries[key] = translation
+                self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        if self._db is not None:
+            with self._db_lock:
+                self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", rows)
+                self._db.executemany(
+                    "DELETE FROM translations WHERE text = ? AND src_lang = ? AND tgt_lang = ?", evicted
+                )
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
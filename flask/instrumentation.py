@@ -0,0 +1,327 @@
+"""
+Stage timers, counters and gauges shared by the translate, F5-TTS and XTTS servers,
+rendered in the Prometheus text format on /metrics.
+
+    from instrumentation import stage, BATCH_SIZE, init_app
+
+    with stage("generate"):
+        outputs = model.generate(...)
+
+`init_app(app, service)` adds the /metrics route, per-endpoint request latency and
+the X-Trace-Id header: an incoming trace id is reused (or a new one created) and
+echoed on the response, and `trace_headers()` forwards it on outgoing calls so a
+translate request and the TTS request it triggers can be matched in the logs.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+
+# Per-thread list that Histogram.observe also appends to while record_observations() is active
+_recording = threading.local()
+
+# Seconds; covers a ~1 ms tokenizer call up to a multi-minute long-form synthesis
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        if not re.fullmatch(r"[a-zA-Z_:][a-zA-Z0-9_:]*", name):
+            raise ValueError(f"Invalid metric name '{name}'")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Gauge(Metric):
+    """A value that is set directly, or read from a callback at scrape time via `set_function`."""
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = fn()
+            except Exception as e:
+                logger.debug(f"Metric {self.name} callback failed: {e}")
+                continue
+            if value is not None:
+                values[key] = value
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values.items()]
+
+
+class Counter(Gauge):
+    """A monotonically increasing value; `set_function` can expose a counter kept elsewhere (e.g. cache stats)."""
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # key -> [bucket counts..., sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+        observations = getattr(_recording, "observations", None)
+        if observations is not None:
+            observations.append((self.name, value, labels))
+
+    def render(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = self.header()
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stage_duration_seconds",
+    "Time spent in a hot-path stage (tokenize, generate, decode, ref_preprocess, inference, vocoder, wav_encode, ...).",
+    ["stage"],
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "batch_size", "Number of items run together in one model call.", ["batcher"], buckets=SIZE_BUCKETS,
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge("queue_depth", "Items waiting in a queue.", ["queue"]))
+CACHE_LOOKUPS = REGISTRY.register(Counter("cache_lookups_total", "Cache lookups by result (hit or miss).", ["cache", "result"]))
+CACHE_HIT_RATE = REGISTRY.register(Gauge("cache_hit_rate", "Fraction of cache lookups that hit.", ["cache"]))
+MODEL_MEMORY = REGISTRY.register(Gauge("model_memory_bytes", "Bytes held by model parameters and buffers.", ["model"]))
+PROCESS_MEMORY = REGISTRY.register(Gauge("process_memory_bytes", "Process memory by kind.", ["kind"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to produce a response (streamed bodies excluded).", ["service", "endpoint", "status"],
+))
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block into stage_duration_seconds{stage=name}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+@contextmanager
+def record_observations():
+    """
+    Collects the (metric name, value, labels) of histogram observations made on this thread,
+    so a worker process whose own registry is never scraped can send them to the server
+    process, which adds them to its histograms with `replay`.
+    """
+    observations = []
+    _recording.observations = observations
+    try:
+        yield observations
+    finally:
+        _recording.observations = None
+
+
+def replay(observations):
+    for name, value, labels in observations:
+        REGISTRY.get(name).observe(value, **labels)
+
+
+def timed(fn, name):
+    """Wraps a callable so each call is timed as stage `name`."""
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    wrapper.__wrapped__ = fn
+    # Marks our own wrapper; __wrapped__ alone is also set by functools.wraps (e.g. torch.inference_mode)
+    wrapper._stage_timed = True
+    return wrapper
+
+
+def time_method(obj, method_name, name):
+    """Times calls to `obj.<method_name>` as stage `name`, e.g. a vocoder's decode() inside a library call."""
+    method = getattr(obj, method_name)
+    if not getattr(method, "_stage_timed", False):
+        setattr(obj, method_name, timed(method, name))
+    return obj
+
+
+def track_cache(name, stats_fn):
+    """Exposes hits, misses and hit rate from a cache's stats() dict."""
+    CACHE_LOOKUPS.set_function(lambda: stats_fn()["hits"], cache=name, result="hit")
+    CACHE_LOOKUPS.set_function(lambda: stats_fn()["misses"], cache=name, result="miss")
+
+    def hit_rate():
+        stats = stats_fn()
+        lookups = stats["hits"] + stats["misses"]
+        return stats["hits"] / lookups if lookups else 0.0
+
+    CACHE_HIT_RATE.set_function(hit_rate, cache=name)
+
+
+def module_bytes(model):
+    """Parameter and buffer bytes of a torch module, or None for non-torch models (e.g. ONNX Runtime)."""
+    if not hasattr(model, "parameters"):
+        return None
+    total = sum(p.numel() * p.element_size() for p in model.parameters())
+    if hasattr(model, "buffers"):
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+    return total
+
+
+def track_model(name, model):
+    size = module_bytes(model)
+    if size is not None:
+        MODEL_MEMORY.set(size, model=name)
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _cuda_allocated_bytes():
+    torch = sys.modules.get("torch")  # Only reported once the server has imported torch
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return torch.cuda.memory_allocated()
+
+
+PROCESS_MEMORY.set_function(_rss_bytes, kind="rss")
+PROCESS_MEMORY.set_function(_cuda_allocated_bytes, kind="cuda_allocated")
+
+
+def current_trace_id():
+    """The trace id of the Flask request being handled on this thread, if any."""
+    from flask import g, has_request_context
+
+    return g.get("trace_id") if has_request_context() else None
+
+
+def trace_headers():
+    """Headers that carry the current trace id to a downstream service."""
+    trace_id = current_trace_id()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def init_app(app, service):
+    """Adds /metrics, request latency and trace id handling to a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_trace():
+        g.trace_id = request.headers.get(TRACE_HEADER) or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_trace(response):
+        if "request_start" in g and request.endpoint != "metrics":
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - g.request_start,
+                service=service, endpoint=request.endpoint or "unknown", status=response.status_code,
+            )
+        if "trace_id" in g:
+            response.headers[TRACE_HEADER] = g.trace_id
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,216 @@
+"""
+Language codes shared by the translate and TTS servers.
+
+NLLB uses FLORES-200 codes ("hin_Deva"), the frontend's Whisper-style inputs and XTTS
+use ISO 639-1 ("hi", XTTS spells Chinese "zh-cn"), and the F5 fine-tunes in
+`voice_clone_model_list` are keyed by language name ("hindi_futurix"). LanguageIndex
+maps between the three once, at import, so requests are validated and routed with
+dictionary lookups and an unsupported code is rejected before any model runs.
+
+    from languages import LANGUAGES, UnsupportedLanguage
+
+    LANGUAGES.nllb("hi")            # "hin_Deva"
+    LANGUAGES.tts_route("hin_Deva")  # ("xtts", "hi")
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+from voice_models import voice_clone_model_list, unloadable_voice_models
+
+# FLORES-200 codes understood by NLLB-200, with display names
+NLLB_LANGUAGES = {"ace_Arab": "Achinese (Arabic script)", "ace_Latn": "Achinese (Latin script)", "acm_Arab": "Iraqi Arabic (Arabic script)", "acq_Arab": "Ta'izzi-Adeni Arabic (Arabic script)", "aeb_Arab": "Tunisian Arabic (Arabic script)", "afr_Latn": "Afrikaans", "ajp_Arab": "South Levantine Arabic (Arabic script)", "aka_Latn": "Akan", "amh_Ethi": "Amharic", "apc_Arab": "North Levantine Arabic (Arabic script)", "arb_Arab": "Standard Arabic (Arabic script)", "ars_Arab": "Najdi Arabic (Arabic script)", "ary_Arab": "Moroccan Arabic (Arabic script)", "arz_Arab": "Egyptian Arabic (Arabic script)", "ast_Latn": "Asturian", "awa_Deva": "Awadhi (Devanagari script)", "ayr_Latn": "Aymara", "azb_Arab": "South Azerbaijani (Arabic script)", "azj_Latn": "North Azerbaijani (Latin script)", "bak_Cyrl": "Bashkir (Cyrillic script)", "bam_Latn": "Bambara", "ban_Latn": "Balinese", "bel_Cyrl": "Belarusian (Cyrillic script)", "bem_Latn": "Bemba", "ben_Beng": "Bengali", "bho_Deva": "Bhojpuri (Devanagari script)", "bjn_Arab": "Banjar (Arabic script)", "bjn_Latn": "Banjar (Latin script)", "bod_Tibt": "Tibetan", "bos_Latn": "Bosnian (Latin script)", "bug_Latn": "Buginese", "bul_Cyrl": "Bulgarian (Cyrillic script)", "cat_Latn": "Catalan", "ceb_Latn": "Cebuano", "cjk_Latn": "Chokwe", "ckb_Arab": "Central Kurdish (Arabic script)", "crh_Latn": "Crimean Tatar (Latin script)", "cym_Latn": "Welsh", "dan_Latn": "Danish", "deu_Latn": "German", "dik_Latn": "Dinka", "dyu_Latn": "Dyula", "dzo_Tibt": "Dzongkha (Tibetan script)", "eng_Latn": "English", "epo_Latn": "Esperanto", "est_Latn": "Estonian", "ewe_Latn": "Ewe", "fao_Latn": "Faroese", "fij_Latn": "Fijian", "fin_Latn": "Finnish", "fon_Latn": "Fon", "fra_Latn": "French", "fur_Latn": "Friulian", "fuv_Latn": "Nigerian Fulfulde", "gaz_Latn": "West Central Oromo", "gla_Latn": "Scottish Gaelic", "gle_Latn": "Irish", "glg_Latn": "Galician", "grn_Latn": "Guarani", "guj_Gujr": "Gujarati", "hat_Latn": "Haitian Creole", "hau_Latn": "Hausa", "heb_Hebr": "Hebrew", "hin_Deva": "Hindi (Devanagari script)", "hne_Deva": "Chhattisgarhi (Devanagari script)", "hrv_Latn": "Croatian", "hun_Latn": "Hungarian", "hye_Armn": "Armenian", "ibo_Latn": "Igbo", "ilo_Latn": "Ilocano", "ind_Latn": "Indonesian", "isl_Latn": "Icelandic", "ita_Latn": "Italian", "jav_Latn": "Javanese", "jpn_Jpan": "Japanese (Japanese script)", "kab_Latn": "Kabyle", "kac_Latn": "Jingpho", "kam_Latn": "Kamba", "kan_Knda": "Kannada", "kas_Arab": "Kashmiri (Arabic script)", "kas_Deva": "Kashmiri (Devanagari script)", "kat_Geor": "Georgian", "knc_Arab": "Central Kanuri (Arabic script)", "knc_Latn": "Central Kanuri (Latin script)", "kon_Latn": "Kongo", "kor_Hang": "Korean (Hangul script)", "lao_Laoo": "Lao", "lij_Latn": "Ligurian", "lim_Latn": "Limburgish", "lin_Latn": "Lingala", "lit_Latn": "Lithuanian", "ltg_Latn": "Latgalian", "ltz_Latn": "Luxembourgish", "lua_Latn": "Luba-Kasai", "lug_Latn": "Ganda", "luo_Latn": "Luo", "lus_Latn": "Mizo", "mag_Deva": "Magahi (Devanagari script)", "mai_Deva": "Maithili (Devanagari script)", "mal_Mlym": "Malayalam", "mar_Deva": "Marathi (Devanagari script)", "min_Latn": "Minangkabau", "mkd_Cyrl": "Macedonian (Cyrillic script)", "mlg_Latn": "Malagasy", "mlt_Latn": "Maltese", "mni_Beng": "Manipuri (Bengali script)", "mos_Latn": "Mossi", "mri_Latn": "Maori", "mya_Mymr": "Burmese (Myanmar script)", "nld_Latn": "Dutch", "nno_Latn": "Norwegian Nynorsk", "nob_Latn": "Norwegian Bokmål", "npi_Deva": "Nepali (Devanagari script)", "nso_Latn": "Northern Sotho", "nus_Latn": "Nuer", "nya_Latn": "Chichewa", "oci_Latn": "Occitan", "ory_Orya": "Odia", "pag_Latn": "Pangasinan", "pan_Guru": "Punjabi (Gurmukhi script)", "pap_Latn": "Papiamento", "pbt_Arab": "Southern Pashto (Arabic script)", "plt_Latn": "Plateau Malagasy", "pol_Latn": "Polish", "por_Latn": "Portuguese", "prs_Arab": "Dari (Arabic script)", "pus_Arab": "Northern Pashto (Arabic script)", "que_Latn": "Quechua", "ron_Latn": "Romanian", "run_Latn": "Rundi", "rus_Cyrl": "Russian (Cyrillic script)", "sag_Latn": "Sango", "san_Deva": "Sanskrit (Devanagari script)", "sat_Beng": "Santali (Bengali script)", "scn_Latn": "Sicilian", "shn_Mymr": "Shan (Myanmar script)", "sin_Sinh": "Sinhala", "slk_Latn": "Slovak", "slv_Latn": "Slovenian", "smo_Latn": "Samoan", "sna_Latn": "Shona", "snd_Arab": "Sindhi (Arabic script)", "som_Latn": "Somali", "sot_Latn": "Southern Sotho", "spa_Latn": "Spanish", "srd_Latn": "Sardinian", "srp_Cyrl": "Serbian (Cyrillic script)", "ssw_Latn": "Swati", "sun_Latn": "Sundanese", "swe_Latn": "Swedish", "swh_Latn": "Swahili", "szl_Latn": "Silesian", "tam_Taml": "Tamil", "tat_Cyrl": "Tatar (Cyrillic script)", "tel_Telu": "Telugu", "tgk_Cyrl": "Tajik (Cyrillic script)", "tgl_Latn": "Tagalog", "tha_Thai": "Thai", "tir_Ethi": "Tigrinya (Ethiopic script)", "tpi_Latn": "Tok Pisin", "tsn_Latn": "Tswana", "tso_Latn": "Tsonga", "tuk_Latn": "Turkmen", "tum_Latn": "Tumbuka", "tur_Latn": "Turkish", "twi_Latn": "Twi", "tzm_Latn": "Central Atlas Tamazight (Latin script)", "uig_Arab": "Uyghur (Arabic script)", "ukr_Cyrl": "Ukrainian (Cyrillic script)", "umb_Latn": "Umbundu", "urd_Arab": "Urdu (Arabic script)", "uzn_Latn": "Northern Uzbek (Latin script)", "vec_Latn": "Venetian", "vie_Latn": "Vietnamese", "war_Latn": "Waray", "wol_Latn": "Wolof", "xho_Latn": "Xhosa", "ydd_Hebr": "Eastern Yiddish (Hebrew script)", "yor_Latn": "Yoruba", "yue_Hant": "Cantonese (Traditional Chinese script)", "zho_Hans": "Mandarin (Simplified Chinese script)", "zho_Hant": "Mandarin (Traditional Chinese script)", "zul_Latn": "Zulu"}
+
+# NLLB languages missing from the frontend's list that still have an ISO 639-1 code
+NLLB_LANGUAGES.update({"asm_Beng": "Assamese", "ces_Latn": "Czech", "ell_Grek": "Greek", "eus_Latn": "Basque", "pes_Arab": "Western Persian", "kaz_Cyrl": "Kazakh", "khm_Khmr": "Khmer", "khk_Cyrl": "Halh Mongolian", "lvs_Latn": "Standard Latvian", "zsm_Latn": "Standard Malay", "als_Latn": "Tosk Albanian", "kir_Cyrl": "Kyrgyz", "kin_Latn": "Kinyarwanda"})
+
+# ISO 639-1 (Whisper-style) input languages, with display names
+ISO_LANGUAGES = { "am": "Amharic", "ar": "Arabic", "as": "Assamese", "az": "Azerbaijani", "af": "Afrikaans", "ba": "Bashkir", "be": "Belarusian", "bg": "Bulgarian", "bn": "Bengali", "bo": "Tibetan", "br": "Breton", "bs": "Bosnian", "ca": "Catalan", "cs": "Czech", "cy": "Welsh", "da": "Danish", "de": "German", "el": "Greek", "en": "English", "es": "Spanish", "et": "Estonian", "eu": "Basque", "fa": "Persian", "fi": "Finnish", "fo": "Faroese", "fr": "French", "gl": "Galician", "gu": "Gujarati", "ha": "Hausa", "haw": "Hawaiian", "he": "Hebrew", "hi": "Hindi", "hr": "Croatian", "ht": "Haitian Creole", "hu": "Hungarian", "hy": "Armenian", "id": "Indonesian", "is": "Icelandic", "it": "Italian", "ja": "Japanese", "jw": "Javanese", "ka": "Georgian", "kk": "Kazakh", "km": "Khmer", "kn": "Kannada", "ko": "Korean", "la": "Latin", "lb": "Luxembourgish", "ln": "Lingala", "lo": "Lao", "lt": "Lithuanian", "lv": "Latvian", "mg": "Malagasy", "mi": "Maori", "mk": "Macedonian", "ml": "Malayalam", "mn": "Mongolian", "mr": "Marathi", "ms": "Malay", "mt": "Maltese", "my": "Burmese", "ne": "Nepali", "nl": "Dutch", "nn": "Norwegian Nynorsk", "no": "Norwegian", "oc": "Occitan", "pa": "Punjabi", "pl": "Polish", "ps": "Pashto", "pt": "Portuguese", "ro": "Romanian", "ru": "Russian", "sa": "Sanskrit", "sd": "Sindhi", "si": "Sinhala", "sk": "Slovak", "sl": "Slovenian", "sn": "Shona", "so": "Somali", "sq": "Albanian", "sr": "Serbian", "su": "Sundanese", "sv": "Swedish", "sw": "Swahili", "ta": "Tamil", "te": "Telugu", "tg": "Tajik", "th": "Thai", "tk": "Turkmen", "tl": "Tagalog", "tr": "Turkish", "tt": "Tatar", "uk": "Ukrainian", "ur": "Urdu", "uz": "Uzbek", "vi": "Vietnamese", "yi": "Yiddish", "yo": "Yoruba", "zh": "Chinese", "yue": "Cantonese"}
+
+# ISO 639-1 code -> the NLLB code used when translating from or into it
+ISO_TO_NLLB = {
+    "af": "afr_Latn", "ak": "aka_Latn", "am": "amh_Ethi", "ar": "arb_Arab", "as": "asm_Beng", "ay": "ayr_Latn",
+    "az": "azj_Latn", "ba": "bak_Cyrl", "be": "bel_Cyrl", "bg": "bul_Cyrl", "bm": "bam_Latn", "bn": "ben_Beng",
+    "bo": "bod_Tibt", "bs": "bos_Latn", "ca": "cat_Latn", "cs": "ces_Latn", "cy": "cym_Latn", "da": "dan_Latn",
+    "de": "deu_Latn", "dz": "dzo_Tibt", "ee": "ewe_Latn", "el": "ell_Grek", "en": "eng_Latn", "eo": "epo_Latn",
+    "es": "spa_Latn", "et": "est_Latn", "eu": "eus_Latn", "fa": "pes_Arab", "ff": "fuv_Latn", "fi": "fin_Latn",
+    "fj": "fij_Latn", "fo": "fao_Latn", "fr": "fra_Latn", "ga": "gle_Latn", "gd": "gla_Latn", "gl": "glg_Latn",
+    "gn": "grn_Latn", "gu": "guj_Gujr", "ha": "hau_Latn", "he": "heb_Hebr", "hi": "hin_Deva", "hr": "hrv_Latn",
+    "ht": "hat_Latn", "hu": "hun_Latn", "hy": "hye_Armn", "id": "ind_Latn", "ig": "ibo_Latn", "is": "isl_Latn",
+    "it": "ita_Latn", "ja": "jpn_Jpan", "jw": "jav_Latn", "ka": "kat_Geor", "kg": "kon_Latn", "kk": "kaz_Cyrl",
+    "km": "khm_Khmr", "kn": "kan_Knda", "ko": "kor_Hang", "ks": "kas_Arab", "ky": "kir_Cyrl", "lb": "ltz_Latn",
+    "lg": "lug_Latn", "li": "lim_Latn", "ln": "lin_Latn", "lo": "lao_Laoo", "lt": "lit_Latn", "lv": "lvs_Latn",
+    "mg": "plt_Latn", "mi": "mri_Latn", "mk": "mkd_Cyrl", "ml": "mal_Mlym", "mn": "khk_Cyrl", "mr": "mar_Deva",
+    "ms": "zsm_Latn", "mt": "mlt_Latn", "my": "mya_Mymr", "ne": "npi_Deva", "nl": "nld_Latn", "nn": "nno_Latn",
+    "no": "nob_Latn", "ny": "nya_Latn", "oc": "oci_Latn", "om": "gaz_Latn", "pa": "pan_Guru", "pl": "pol_Latn",
+    "ps": "pbt_Arab", "pt": "por_Latn", "qu": "que_Latn", "rn": "run_Latn", "ro": "ron_Latn", "ru": "rus_Cyrl",
+    "rw": "kin_Latn", "sa": "san_Deva", "sc": "srd_Latn", "sd": "snd_Arab", "sg": "sag_Latn", "si": "sin_Sinh",
+    "sk": "slk_Latn", "sl": "slv_Latn", "sm": "smo_Latn", "sn": "sna_Latn", "so": "som_Latn", "sq": "als_Latn",
+    "sr": "srp_Cyrl", "ss": "ssw_Latn", "st": "sot_Latn", "su": "sun_Latn", "sv": "swe_Latn", "sw": "swh_Latn",
+    "ta": "tam_Taml", "te": "tel_Telu", "tg": "tgk_Cyrl", "th": "tha_Thai", "ti": "tir_Ethi", "tk": "tuk_Latn",
+    "tl": "tgl_Latn", "tn": "tsn_Latn", "tr": "tur_Latn", "ts": "tso_Latn", "tt": "tat_Cyrl", "tw": "twi_Latn",
+    "ug": "uig_Arab", "uk": "ukr_Cyrl", "ur": "urd_Arab", "uz": "uzn_Latn", "vi": "vie_Latn", "wo": "wol_Latn",
+    "xh": "xho_Latn", "yi": "ydd_Hebr", "yo": "yor_Latn", "yue": "yue_Hant", "zh": "zho_Hans", "zu": "zul_Latn",
+}
+# Other NLLB codes that share an ISO 639-1 code with the one above
+NLLB_ISO_ALIASES = {"zho_Hant": "zh", "mlg_Latn": "mg", "pus_Arab": "ps", "kas_Deva": "ks", "ars_Arab": "ar", "arz_Arab": "ar", "acm_Arab": "ar", "apc_Arab": "ar", "ajp_Arab": "ar", "ary_Arab": "ar", "aeb_Arab": "ar", "acq_Arab": "ar"}
+
+# Languages Coqui XTTS v2 can speak, ISO 639-1 -> XTTS language id
+XTTS_LANGUAGES = {
+    "en": "en", "es": "es", "fr": "fr", "de": "de", "it": "it", "pt": "pt", "pl": "pl", "tr": "tr", "ru": "ru",
+    "nl": "nl", "cs": "cs", "ar": "ar", "zh": "zh-cn", "ja": "ja", "hu": "hu", "ko": "ko", "hi": "hi",
+}
+
+# Languages the base F5-TTS checkpoint was trained on
+F5_BASE_LANGUAGES = ("en", "zh")
+# Language name prefix of the voice_clone_model_list keys -> ISO 639-1
+F5_MODEL_PREFIXES = {
+    "spanish": "es", "thai": "th", "russian": "ru", "portuguese": "pt", "hungarian": "hu", "greek": "el",
+    "french": "fr", "turkish": "tr", "indonesian": "id", "german": "de", "finnish": "fi", "italian": "it",
+    "norwegian": "no", "vietnamese": "vi", "english": "en", "malaysian": "ms", "hindi": "hi", "arabic": "ar",
+    "gujarati": "gu", "slovak": "sk",
+}
+# Models whose key doesn't start with a single language name
+F5_MODEL_OVERRIDES = {"erax_unixsex": ("vi",), "erax_female": ("vi",), "multi_eng_ger_pol": ("en", "de", "pl")}
+
+
+class UnsupportedLanguage(ValueError):
+    pass
+
+
+Language = namedtuple("Language", ["nllb", "iso", "name", "xtts", "f5_models"])
+
+
+def f5_model_languages(model_list=voice_clone_model_list):
+    """ISO 639-1 code -> F5 model keys for it, in model-list order."""
+    models = {}
+    # Single-language models first, so "vietnamese_yuki" is preferred over a multi-purpose one
+    for key in sorted(model_list, key=lambda key: key in F5_MODEL_OVERRIDES):
+        if key in unloadable_voice_models:
+            continue
+        for iso in F5_MODEL_OVERRIDES.get(key) or (F5_MODEL_PREFIXES.get(key.split("_")[0]),):
+            if iso:
+                models.setdefault(iso, []).append(key)
+    return models
+
+
+class LanguageIndex:
+    """
+    Read-only lookup tables between NLLB codes, ISO 639-1 codes and TTS models.
+
+    A code can be given as an NLLB code, an ISO 639-1 code, an XTTS id or a display
+    name (NLLB's, or the plain ISO language name such as "Arabic"); all resolve to
+    the same Language. `with_tokenizer()` returns a copy that
+    also holds NLLB's forced-BOS token ids, restricted to codes the tokenizer knows.
+    """
+
+    __slots__ = ("_languages", "_aliases", "_bos_ids")
+
+    def __init__(self, languages, bos_ids=None):
+        self._languages = MappingProxyType(dict(languages))
+        aliases = {}
+        for language in self._languages.values():
+            for alias in (language.nllb, language.name.lower(), language.name.split(" (")[0].lower()):
+                aliases.setdefault(alias, language.nllb)
+        # ISO and XTTS codes, and the ISO display name, point at the preferred NLLB code only
+        for language in self._languages.values():
+            if language.iso and ISO_TO_NLLB.get(language.iso) == language.nllb:
+                aliases[language.iso] = language.nllb
+                if language.xtts:
+                    aliases[language.xtts] = language.nllb
+                if language.iso in ISO_LANGUAGES:
+                    aliases.setdefault(ISO_LANGUAGES[language.iso].lower(), language.nllb)
+        self._aliases = MappingProxyType(aliases)
+        self._bos_ids = MappingProxyType(dict(bos_ids)) if bos_ids is not None else None
+
+    @classmethod
+    def build(cls, model_list=voice_clone_model_list):
+        nllb_to_iso = {nllb: iso for iso, nllb in ISO_TO_NLLB.items()}
+        nllb_to_iso.update(NLLB_ISO_ALIASES)
+        f5_models = f5_model_languages(model_list)
+        languages = {}
+        for code, name in NLLB_LANGUAGES.items():
+            iso = nllb_to_iso.get(code)
+            languages[code] = Language(
+                nllb=code,
+                iso=iso,
+                name=name,
+                xtts=XTTS_LANGUAGES.get(iso),
+                f5_models=tuple(f5_models.get(iso, ())),
+            )
+        return cls(languages)
+
+    def with_tokenizer(self, tokenizer):
+        """A copy limited to the codes in `tokenizer`'s vocabulary, with their forced-BOS ids resolved."""
+        bos_ids = {}
+        for code in self._languages:
+            token_id = tokenizer.convert_tokens_to_ids(code)
+            if token_id is not None and token_id != tokenizer.unk_token_id:
+                bos_ids[code] = token_id
+        return LanguageIndex({code: self._languages[code] for code in bos_ids}, bos_ids)
+
+    def get(self, code):
+        """The Language for any known spelling of `code`, or None."""
+        if not code:
+            return None
+        nllb = self._aliases.get(code) or self._aliases.get(code.strip().lower())
+        return self._languages.get(nllb)
+
+    def resolve(self, code):
+        language = self.get(code)
+        if language is None:
+            raise UnsupportedLanguage(f"Unsupported language '{code}'")
+        return language
+
+    def nllb(self, code):
+        return self.resolve(code).nllb
+
+    def forced_bos_id(self, code):
+        if self._bos_ids is None:
+            raise RuntimeError("Forced-BOS ids are only known after with_tokenizer()")
+        return self._bos_ids[self.nllb(code)]
+
+    def translation_pair(self, source, target):
+        """Validates a translation request, returning the (source, target) NLLB codes."""
+        return self.nllb(source), self.nllb(target)
+
+    def tts_route(self, code):
+        """
+        Picks the synthesis model for a language: ("xtts", xtts_language) when XTTS speaks it,
+        otherwise ("f5", model_key) for a fine-tune, or ("f5", None) for the base F5 model.
+        """
+        language = self.resolve(code)
+        if language.xtts:
+            return "xtts", language.xtts
+        if language.f5_models:
+            return "f5", language.f5_models[0]
+        if language.iso in F5_BASE_LANGUAGES:
+            return "f5", None
+        raise UnsupportedLanguage(f"No speech synthesis model for '{code}' ({language.name})")
+
+    def xtts(self, code):
+        language = self.resolve(code)
+        if not language.xtts:
+            raise UnsupportedLanguage(f"XTTS cannot speak '{code}' ({language.name})")
+        return language.xtts
+
+    def f5_model(self, code):
+        """The F5 fine-tune for a language, None when the base model covers it."""
+        language = self.resolve(code)
+        if language.f5_models:
+            return language.f5_models[0]
+        if language.iso in F5_BASE_LANGUAGES:
+            return None
+        raise UnsupportedLanguage(f"No F5-TTS model for '{code}' ({language.name})")
+
+    def __contains__(self, code):
+        return self.get(code) is not None
+
+    def __len__(self):
+        return len(self._languages)
+
+    def describe(self):
+        """JSON-ready listing of every supported language and how it is synthesized."""
+        return [language._asdict() | {"f5_models": list(language.f5_models)} for language in self._languages.values()]
+
+
+LANGUAGES = LanguageIndex.build()
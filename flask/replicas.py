@@ -0,0 +1,268 @@
+"""
+Runs several SpeechToTranslate replicas in worker processes on one CPU node.
+
+One generate() loop only keeps a few cores busy, so TranslationPool starts
+`replicas` processes, each pinned to its own slice of the available cores with
+torch's intra-op threads set to the slice size. The torch model is loaded once in
+the parent and moved to shared memory, so the workers map the same weight pages
+and each replica only adds its activations. Calls go to the replica with the
+fewest requests in flight. Stage timings and batch sizes recorded in a replica are
+sent back with its response and added to this process's /metrics.
+
+The pool has the same translate_batch / translate_stream / languages surface as
+SpeechToTranslate, so TranslationBatcher and the Flask endpoints use it unchanged
+(give the batcher one worker thread per replica so the replicas run concurrently).
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from backends import load_translation_model, load_tokenizer, BACKEND, MODEL_ID, SAVE_SNAPSHOT
+from instrumentation import stage, record_observations, replay, QUEUE_DEPTH, track_model
+
+logger = logging.getLogger(__name__)
+
+REPLICAS = int(os.environ.get("TRANSLATE_REPLICAS", "1"))
+# Intra-op threads per replica; by default every core of its slice
+THREADS_PER_REPLICA = int(os.environ.get("TRANSLATE_THREADS_PER_REPLICA", "0"))
+# Pin each replica to its core slice (only where the OS supports affinity)
+PIN_CORES = os.environ.get("TRANSLATE_PIN_CORES", "1") == "1"
+# Backends whose weights can be placed in shared memory; others are loaded by every worker
+SHARED_BACKENDS = ("torch",)
+
+
+def core_slices(replicas, cores=None):
+    """Splits the usable cores into `replicas` contiguous, near-equal slices."""
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if replicas > len(cores):
+        raise ValueError(f"{replicas} replicas need at least as many cores, only {len(cores)} available")
+    size, extra = divmod(len(cores), replicas)
+    slices, start = [], 0
+    for i in range(replicas):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+def _worker_main(index, cores, threads, backend, preloaded, requests, responses):
+    """Replica process: builds SpeechToTranslate around the shared model and serves requests."""
+    import torch
+
+    if PIN_CORES and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    # Concurrency comes from the replicas, not from inter-op parallelism inside one
+    torch.set_num_interop_threads(1)
+
+    from main import SpeechToTranslate
+
+    try:
+        s2t = SpeechToTranslate(input_lang=None, output_lang=None, backend=backend, device="cpu", preloaded=preloaded)
+    except Exception as e:
+        responses.put(("failed", index, None, repr(e), []))
+        return
+    responses.put(("ready", index, None, None, []))
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job_id, method, args = request
+        # The tokenize/generate/decode timings go back with the response, as nobody scrapes this process
+        with record_observations() as observations:
+            try:
+                if method == "translate_stream":
+                    for piece in s2t.translate_stream(*args):
+                        responses.put(("piece", index, job_id, piece, []))
+                    kind, value = "end", None
+                else:
+                    kind, value = "result", getattr(s2t, method)(*args)
+            except Exception as e:
+                kind, value = "error", _picklable(e)
+        responses.put((kind, index, job_id, value, observations))
+
+
+def _picklable(error):
+    # Exceptions with custom constructors may not survive the trip back to the parent
+    import pickle
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(repr(error))
+
+
+class TranslationPool:
+    def __init__(self, replicas=REPLICAS, backend=BACKEND, threads_per_replica=THREADS_PER_REPLICA, start_timeout=600):
+        import torch.multiprocessing as mp
+
+        self.backend = backend
+        self.device = "cpu"
+        slices = core_slices(replicas)
+
+        preloaded = None
+        if backend in SHARED_BACKENDS:
+            # The parent only owns the weights; share_memory() moves them to shared memory so the
+            # workers (started with spawn, so no thread or OpenMP state is forked) map the same pages
+            tokenizer, model, _ = load_translation_model(backend=backend, device="cpu")
+            model.share_memory()
+            preloaded = (tokenizer, model, "cpu")
+            self.translation_tokenizer, self.translation_model = tokenizer, model
+            track_model("nllb", model)
+        else:
+            logger.warning(f"The {backend} backend can't share weights between processes; each replica loads its own copy")
+            if SAVE_SNAPSHOT:
+                # Download/export once here, so the workers all read the snapshot instead of writing it concurrently
+                tokenizer, _, _ = load_translation_model(backend=backend, device="cpu")
+            else:
+                tokenizer = load_tokenizer(MODEL_ID)
+            self.translation_tokenizer, self.translation_model = tokenizer, None
+
+        from languages import LANGUAGES
+        self.languages = LANGUAGES.with_tokenizer(self.translation_tokenizer)
+
+        ctx = mp.get_context("spawn")
+        self._responses = ctx.Queue()
+        self._requests = [ctx.Queue() for _ in slices]
+        self._inflight = [0] * len(slices)
+        self._pending = {}  # job_id -> (replica, Future or queue.Queue for streams)
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._workers = []
+        for index, cores in enumerate(slices):
+            threads = threads_per_replica or len(cores)
+            worker = ctx.Process(
+                target=_worker_main,
+                args=(index, cores, threads, backend, preloaded, self._requests[index], self._responses),
+                name=f"translate-replica-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+            QUEUE_DEPTH.set_function(lambda index=index: self._inflight[index], queue=f"translate_replica_{index}")
+            logger.info(f"Started translation replica {index} on cores {cores} with {threads} thread(s)")
+
+        self._wait_ready(start_timeout)
+        self._reader = threading.Thread(target=self._read_responses, name="translate-replica-reader", daemon=True)
+        self._reader.start()
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def _wait_ready(self, timeout):
+        ready = 0
+        while ready < len(self._workers):
+            try:
+                kind, index, _, error, _ = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                self.close()
+                raise RuntimeError(f"Translation replicas did not start within {timeout}s")
+            if kind == "failed":
+                self.close()
+                raise RuntimeError(f"Translation replica {index} failed to start: {error}")
+            ready += 1
+
+    def _dispatch(self, method, args, stream=False):
+        with self._lock:
+            # Least loaded live replica; ties go to the lowest index
+            alive = [i for i, worker in enumerate(self._workers) if worker.is_alive()]
+            if not alive:
+                raise RuntimeError("No translation replica is running")
+            index = min(alive, key=self._inflight.__getitem__)
+            self._inflight[index] += 1
+            job_id = next(self._ids)
+            waiter = queue.Queue() if stream else Future()
+            self._pending[job_id] = (index, waiter)
+        self._requests[index].put((job_id, method, args))
+        return waiter
+
+    def _finish(self, job_id):
+        """Removes a finished job, returning its waiter, or None if it was already failed."""
+        with self._lock:
+            index, waiter = self._pending.pop(job_id, (None, None))
+            if index is not None:
+                self._inflight[index] -= 1
+        return waiter
+
+    def _read_responses(self):
+        last_check = time.monotonic()
+        while True:
+            # This is the only thread resolving requests, so nothing may end its loop
+            try:
+                # Checked about once a second, also under load, so requests on a crashed replica don't hang
+                if time.monotonic() - last_check >= 1:
+                    self._fail_dead_workers()
+                    last_check = time.monotonic()
+                try:
+                    message = self._responses.get(timeout=1)
+                except queue.Empty:
+                    continue
+                self._handle(*message)
+            except Exception:
+                logger.exception("Failed to handle a translation replica response")
+
+    def _handle(self, kind, index, job_id, value, observations):
+        replay(observations)
+        # A job may already have been failed by _fail_dead_workers when its last messages arrive
+        if kind == "piece":
+            with self._lock:
+                _, waiter = self._pending.get(job_id, (None, None))
+            if waiter is not None:
+                waiter.put(value)
+            return
+        waiter = self._finish(job_id)
+        if waiter is None:
+            return
+        if kind == "end":
+            waiter.put(None)
+        elif kind == "result":
+            waiter.set_result(value)
+        elif kind == "error":
+            if isinstance(waiter, Future):
+                waiter.set_exception(value)
+            else:
+                waiter.put(value)
+
+    def _fail_dead_workers(self):
+        for index, worker in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            with self._lock:
+                lost = [job_id for job_id, (replica, _) in self._pending.items() if replica == index]
+            for job_id in lost:
+                waiter = self._finish(job_id)
+                error = RuntimeError(f"Translation replica {index} exited with code {worker.exitcode}")
+                if isinstance(waiter, Future):
+                    waiter.set_exception(error)
+                else:
+                    waiter.put(error)
+            if lost:
+                logger.error(f"Translation replica {index} died, failed {len(lost)} request(s)")
+
+    def translate_batch(self, transcripts, output_lang=None, input_lang=None):
+        with stage("replica_call"):
+            return self._dispatch("translate_batch", (transcripts, output_lang, input_lang)).result()
+
+    def translate_stream(self, transcript, output_lang=None, input_lang=None):
+        pieces = self._dispatch("translate_stream", (transcript, output_lang, input_lang), stream=True)
+        while True:
+            piece = pieces.get()
+            if piece is None:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+    def close(self):
+        for requests, worker in zip(self._requests, self._workers):
+            if worker.is_alive():
+                requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
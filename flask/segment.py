@@ -0,0 +1,115 @@
+import os
+import re
+
+
+# Longest piece (in characters) sent to the model as one sequence. NLLB generates at most
+# 200 tokens per sequence by default, so pieces are kept well under that.
+MAX_SEGMENT_CHARS = int(os.environ.get("TRANSLATE_MAX_SEGMENT_CHARS", "400"))
+
+# Terminators that end a sentence only when followed by whitespace (Latin, Cyrillic, Greek, ...)
+SPACED_TERMINATORS = ".!?;"
+# Terminators that end a sentence on their own: Devanagari/Bengali danda, CJK full stops,
+# Arabic/Urdu question mark and full stop, Ethiopic, Myanmar, Armenian and Tibetan shad
+UNSPACED_TERMINATORS = "।॥。！？｡؟۔።၊။։།"
+
+CLOSERS = "\"'”’»)\\]」』"
+SENTENCE_END = re.compile(
+    r"[%s][%s]*(?=\s)|[%s][%s]*"
+    % (re.escape(SPACED_TERMINATORS), CLOSERS, re.escape(UNSPACED_TERMINATORS), CLOSERS)
+)
+# Words whose trailing period is not a sentence end
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "no"}
+CLAUSE_END = re.compile(r"(?<=[,،、，:;—])\s*")
+
+# NLLB script suffixes whose writing systems put no space between sentences (Thai, Lao,
+# Khmer and Burmese leave out spaces between words but still put one between sentences)
+UNSPACED_SCRIPTS = {"Jpan", "Hans", "Hant"}
+
+
+def sentence_ends(text):
+    """Offsets just past each sentence terminator in text, skipping abbreviations."""
+    ends = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        words = text[start:match.end()].split()
+        last_word = words[-1].rstrip(".").lower() if words else ""
+        if match.group().startswith(".") and (last_word in ABBREVIATIONS or len(last_word) == 1):
+            continue
+        ends.append(match.end())
+        start = match.end()
+    return ends
+
+
+def split_sentences(text):
+    bounds = [0] + sentence_ends(text) + [len(text)]
+    sentences = [text[start:end].strip() for start, end in zip(bounds, bounds[1:])]
+    return [s for s in sentences if s]
+
+
+def split_complete(text):
+    """Returns (complete sentences, unfinished trailing text) for a partial transcript."""
+    # A trailing "." only counts once whitespace follows it, so "3." of "3.5" waits for more text
+    ends = sentence_ends(text)
+    last = ends[-1] if ends else 0
+    return split_sentences(text[:last]), text[last:].lstrip()
+
+
+def split_long(sentence, max_chars=MAX_SEGMENT_CHARS):
+    """Splits an over-long sentence on clause punctuation, then on whitespace."""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    pieces = []
+    current = ""
+    for part in CLAUSE_END.split(sentence):
+        words = part.split() if len(part) > max_chars else [part]
+        for word in words:
+            candidate = f"{current} {word}".strip() if current else word
+            if len(candidate) <= max_chars or not current:
+                current = candidate
+            else:
+                pieces.append(current)
+                current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def segment_text(text, max_chars=MAX_SEGMENT_CHARS):
+    """Splits text into model-sized segments.
+
+    Returns (segments, separators) where separators[i] is the break that followed
+    segments[i] in the source: "\\n" for a paragraph break, " " otherwise.
+    """
+    segments, separators = [], []
+    paragraphs = [p for p in text.splitlines() if p.strip()]
+    for paragraph in paragraphs:
+        for sentence in split_sentences(paragraph):
+            for piece in split_long(sentence, max_chars):
+                segments.append(piece)
+                separators.append(" ")
+        if separators:
+            separators[-1] = "\n"
+    if separators:
+        separators[-1] = ""
+    return segments, separators
+
+
+def join_segments(translations, separators, output_lang):
+    script = output_lang.split("_")[-1] if output_lang else ""
+    space = "" if script in UNSPACED_SCRIPTS else " "
+    return "".join(t + (space if sep == " " else sep) for t, sep in zip(translations, separators))
+
+
+def pack_batches(lengths, max_batch_tokens):
+    """Groups indices into length-sorted batches whose padded size stays under max_batch_tokens."""
+    batches, current = [], []
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # Sorted ascending, so the newest item sets the padded length of the batch
+        if current and (len(current) + 1) * lengths[i] > max_batch_tokens:
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
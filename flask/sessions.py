@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+
+
+SESSION_TTL_SECONDS = float(os.environ.get("TRANSLATE_SESSION_TTL", "3600"))
+
+
+class SessionStore:
+    """Thread-safe per-session language settings and last translation.
+
+    Entries idle for longer than `ttl` seconds are dropped on the next write.
+    The store lives in process memory, so a multi-process deployment needs
+    sticky sessions for the polling endpoint to see its own results.
+    """
+
+    def __init__(self, default_output_lang, ttl=SESSION_TTL_SECONDS):
+        self.default_output_lang = default_output_lang
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return self._new_session()
+            return dict(session)
+
+    def update(self, session_id, **fields):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.setdefault(session_id, self._new_session())
+            session.update(fields)
+            session["updated_at"] = now
+            return dict(session)
+
+    def _new_session(self):
+        # translated_lang is the language of translated_text, which a call may pick without changing output_lang
+        return {"input_lang": None, "output_lang": self.default_output_lang, "translated_text": "", "translated_lang": None}
+
+    def _expire(self, now):
+        stale = [sid for sid, session in self._sessions.items() if now - session["updated_at"] > self.ttl]
+        for sid in stale:
+            del self._sessions[sid]
@@ -0,0 +1,146 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from segment import split_complete, split_long
+from sessions import SESSION_TTL_SECONDS
+
+
+# Sent on the event queue once a final segment's translations have all been pushed
+END_OF_STREAM = object()
+# Sent events kept per stream for clients that reconnect with Last-Event-ID
+REPLAY_EVENTS = 256
+
+
+def sse_event(data, event=None, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class StreamingTranslator:
+    """Translates incremental transcripts sentence by sentence for SSE clients.
+
+    Partial transcript text is appended to a per-session buffer with `feed`.
+    Every completed sentence is submitted to the batcher straight away and its
+    translation is pushed to the session's event queue, which `events` drains
+    in sentence order. The position in that order is kept on the stream, so a
+    client that reconnects continues where the last one stopped; events carry
+    their index as the SSE id, and ones after `last_event_id` are sent again.
+
+    Like SessionStore, streams that were neither fed nor read for longer than
+    `ttl` seconds (abandoned, or never sent a final segment) are dropped when
+    another stream is opened.
+    """
+
+    def __init__(self, batcher, ttl=SESSION_TTL_SECONDS):
+        self.batcher = batcher
+        self.ttl = ttl
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _stream(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            if session_id not in self._streams:
+                self._expire(now)
+            stream = self._streams.setdefault(session_id, {
+                "buffer": "",
+                "next_index": 0,
+                "events": queue.Queue(),
+                "lock": threading.Lock(),
+                "waiting": {},  # index -> (piece, result) that arrived ahead of next_emit
+                "next_emit": 0,
+                "sent": deque(maxlen=REPLAY_EVENTS),  # (index, SSE text)
+                "reader": 0,  # Bumped by every connection; older ones stop reading
+            })
+            stream["updated_at"] = now
+            return stream
+
+    def _expire(self, now):
+        stale = [sid for sid, stream in self._streams.items() if now - stream["updated_at"] > self.ttl]
+        for sid in stale:
+            del self._streams[sid]
+
+    def feed(self, session_id, text, output_lang, input_lang=None, final=False):
+        stream = self._stream(session_id)
+        with stream["lock"]:
+            stream["buffer"] += text
+            sentences, stream["buffer"] = split_complete(stream["buffer"])
+            if final and stream["buffer"]:
+                sentences.append(stream["buffer"])
+                stream["buffer"] = ""
+
+            pieces = [piece for sentence in sentences for piece in split_long(sentence)]
+            start = stream["next_index"]
+            stream["next_index"] += len(pieces)
+            end = stream["next_index"]
+
+        for index, piece in enumerate(pieces, start):
+            future = self.batcher.submit(piece, output_lang, input_lang)
+            future.add_done_callback(
+                lambda f, index=index, piece=piece: stream["events"].put((index, piece, f))
+            )
+        if final:
+            stream["events"].put((end, None, END_OF_STREAM))
+        return len(pieces)
+
+    def events(self, session_id, timeout=None, last_event_id=None):
+        """Yields SSE-formatted translations in order until the stream is finalized."""
+        stream = self._stream(session_id)
+        with stream["lock"]:
+            stream["reader"] += 1
+            reader = stream["reader"]
+            replay = [text for index, text in stream["sent"] if last_event_id is not None and index > last_event_id]
+        yield from replay
+
+        while True:
+            try:
+                item = stream["events"].get(timeout=timeout)
+            except queue.Empty:
+                if stream["reader"] != reader:
+                    return
+                # A connected reader keeps its stream from expiring
+                stream["updated_at"] = time.monotonic()
+                yield ": keep-alive\n\n"
+                continue
+
+            with stream["lock"]:
+                if stream["reader"] != reader:
+                    # A newer connection took over the stream; leave the event to it
+                    stream["events"].put(item)
+                    return
+                index, piece, result = item
+                stream["waiting"][index] = (piece, result)
+                ready, ended = self._ready_events(stream)
+            if ended:
+                with self._lock:
+                    if self._streams.get(session_id) is stream:
+                        del self._streams[session_id]
+            yield from ready
+            if ended:
+                return
+
+    @staticmethod
+    def _ready_events(stream):
+        """Formats the events that are next in order, returning (SSE texts, whether the stream ended)."""
+        ready = []
+        while stream["next_emit"] in stream["waiting"]:
+            index = stream["next_emit"]
+            piece, result = stream["waiting"].pop(index)
+            if result is END_OF_STREAM:
+                text = sse_event({"index": index}, event="end", event_id=index)
+            elif result.exception() is not None:
+                text = sse_event({"index": index, "source_text": piece, "error": str(result.exception())}, event="error", event_id=index)
+            else:
+                text = sse_event({"index": index, "source_text": piece, "translated_text": result.result()}, event_id=index)
+            stream["sent"].append((index, text))
+            ready.append(text)
+            stream["next_emit"] += 1
+            if result is END_OF_STREAM:
+                return ready, True
+        return ready, False
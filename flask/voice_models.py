@@ -0,0 +1,55 @@
+voice_clone_model_list = {
+    'spanish_galleg': 'jpgallegoar/F5-Spanish',
+    'thai_viz': 'VIZINTZOR/F5-TTS-THAI',
+    'russian_hotstone': 'hotstone228/F5-TTS-Russian',
+    'portuguese_br_fp': 'firstpixel/F5-TTS-pt-br',
+    'erax_unixsex': 'erax-ai/EraX-Smile-UnixSex-F5',
+    'hungarian_sarpba': 'sarpba/F5-TTS-Hun',
+    'hungarian_mp3': 'mp3pintyo/F5-TTS-Hun',
+    'greek_petros': 'PetrosStav/F5-TTS-Greek',
+    'french_rasp': 'RASPIAUDIO/F5-French-MixedSpeakers-reduced',
+    'turkish_marduk': 'marduk-ra/F5-TTS-Turkish',
+    'indonesian_eempostor': 'Eempostor/F5-TTS-IND-FINETUNE',
+    'german_aihpi': 'aihpi/F5-TTS-German',
+    'finnish_asmo': 'AsmoKoskinen/F5-TTS_Finnish_Model',
+    'italian_alien': 'alien79/F5-TTS-italian',
+    'norwegian_akhbar': 'akhbar/F5_Norwegian',
+    'vietnamese_yuki': 'yukiakai/F5-TTS-Vietnamese',
+    'english_ljspeech': 'sinhprous/F5TTS-stabilized-LJSpeech',
+    'norwegian_syntax': 'SyntaxBreakers/Norsk_TTS',
+    'erax_female': 'erax-ai/EraX-Smile-Female-F5-V1.0',
+    'malaysian_meso_v3': 'mesolitica/Malaysian-F5-TTS-v3',
+    'vietnamese_zalo': 'zalopay/vietnamese-tts', # Note: Might not be strictly F5 but listed
+    'portuguese_br_tharyck': 'Tharyck/multispeaker-ptbr-f5tts',
+    'multi_eng_ger_pol': 'Gregniuki/F5-tts_English_German_Polish',
+    'indonesian_anantoj': 'anantoj/f5-id-v1',
+    'italian_alien_test': 'alien79/f5-ita-test',
+    'thai_muscari': 'Muscari/F5-TTS-TH_Finetuned',
+    'english_fairytale': 'benjamin-paine/fairytaler', # Assuming English based on name
+    'spanish_juanfa_mlx': 'Juanfa/F5-Spanish-MLX-Compat', # Note: MLX might require different handling
+    'malaysian_meso_v1': 'mesolitica/Malaysian-F5-TTS',
+    'hindi_futurix': 'Futurix-AI/Hindi-TTS',
+    'malaysian_meso_v2': 'mesolitica/Malaysian-F5-TTS-v2',
+    'hakka_formospeech': 'formospeech/f5-tts-hakka-finetune',
+    'ami_xiuguluan': 'united-link/f5-tts-ami-xiuguluan-finetune',
+    'arabic_ibrahim': 'IbrahimSalah/F5-TTS-Arabic',
+    'ami_finetune': 'united-link/f5-tts-ami-finetune',
+    'ami_ithuan_trv': 'united-link/f5-tts-ami-finetune-with-ithuan-trv',
+    'hungarian_sarpba_v1': 'sarpba/F5-TTS_V1_hun',
+    'gujarati_harsh': 'HarshBhanushali7705/TTS_for_gujarati_language',
+    'russian_tvi_accent': 'TVI/f5-tts-ru-accent',
+    'slovak_peter': 'petercheben/F5_TTS_Slovak',
+    # Add any other models here if missed
+}
+
+# Entries above that f5-tts.py can't load; they are listed but never offered or routed to
+unloadable_voice_models = {
+    'vietnamese_zalo': 'not an F5-TTS checkpoint',
+    'spanish_juanfa_mlx': 'MLX weights, not a PyTorch checkpoint',
+}
+
+# F5-TTS config (architecture) each fine-tune was trained from. Most community fine-tunes
+# predate F5TTS_v1_Base, so entries not listed here use TTS_FINETUNE_MODEL_NAME (F5TTS_Base)
+voice_clone_model_configs = {
+    'hungarian_sarpba_v1': 'F5TTS_v1_Base',
+}
@@ -0,0 +1,227 @@
+"""
+In-process speech-to-speech pipeline: translate transcript segments with NLLB and
+synthesize them with F5-TTS or XTTS, without going through the HTTP servers.
+
+Translation of segment N+1 runs in a background thread while segment N is being
+synthesized; the stages are connected by a bounded queue so translation never
+runs more than `queue_size` segments ahead.
+
+With --engine f5 the fine-tune for the target language (e.g. hindi_futurix for
+hin_Deva) is loaded; the base F5-TTS model only speaks English and Chinese.
+
+Example:
+    python pipeline.py --input transcript.txt --target-lang hin_Deva \\
+        --engine f5 --ref-audio speaker.wav --output dubbed.wav
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "flask"))
+from segment import segment_text
+from audio_output import as_float32, to_int16
+from languages import LANGUAGES, UnsupportedLanguage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Architecture of fine-tunes without an entry in voice_clone_model_configs, as in f5-tts.py
+FINETUNE_MODEL_NAME = os.environ.get("TTS_FINETUNE_MODEL_NAME", "F5TTS_Base")
+
+# Marks the end of the translated stream (or carries the translator's exception)
+_DONE = object()
+
+
+def load_translator(target_lang, source_lang=None):
+    """Returns translate(texts) -> list of translations, backed by SpeechToTranslate."""
+    from main import SpeechToTranslate
+
+    s2t = SpeechToTranslate(input_lang=source_lang, output_lang=target_lang)
+    return lambda texts: s2t.translate_batch(texts, target_lang, source_lang)
+
+
+def load_f5_synthesizer(ref_audio, ref_text="", model_key=None):
+    """
+    Returns synthesize(text) -> (float samples, sample_rate) using the f5_tts API, with the
+    voice_clone_model_list fine-tune `model_key` or, when None, the base model.
+    """
+    from f5_tts.api import F5TTS
+
+    if model_key:
+        from f5_registry import resolve_checkpoint
+        from voice_models import voice_clone_model_list, voice_clone_model_configs
+
+        ckpt_file, vocab_file = resolve_checkpoint(voice_clone_model_list[model_key])
+        config = voice_clone_model_configs.get(model_key, FINETUNE_MODEL_NAME)
+        logger.info(f"Loading F5-TTS fine-tune '{model_key}' ({config})")
+        f5 = F5TTS(model=config, ckpt_file=ckpt_file, vocab_file=vocab_file)
+    else:
+        f5 = F5TTS()
+
+    def synthesize(text):
+        wav, sr, _ = f5.infer(ref_file=ref_audio, ref_text=ref_text, gen_text=text)
+        return as_float32(wav), sr
+
+    return synthesize
+
+
+def load_xtts_synthesizer(ref_audio, language):
+    """Returns synthesize(text) -> (float samples, sample_rate) using Coqui XTTS v2."""
+    from TTS.api import TTS
+    import torch
+
+    tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
+    tts.to("cuda" if torch.cuda.is_available() else "cpu")
+
+    def synthesize(text):
+        wav = tts.tts(text=text, speaker_wav=[ref_audio], language=language, split_sentences=False)
+        return as_float32(wav), tts.synthesizer.output_sample_rate
+
+    return synthesize
+
+
+def run_pipeline(segments, translate, synthesize, on_audio, queue_size=4, translate_batch_size=1):
+    """
+    Runs translate -> synthesize over `segments` with the two stages overlapped.
+    `on_audio(index, translation, samples, sample_rate)` is called in segment order.
+    Returns per-stage timings in seconds.
+    """
+    translated = queue.Queue(maxsize=queue_size)
+    timings = {"translate": [], "synthesize": [], "queue_wait": []}
+
+    def translate_stage():
+        try:
+            for start in range(0, len(segments), translate_batch_size):
+                batch = segments[start:start + translate_batch_size]
+                t0 = time.perf_counter()
+                outputs = translate(batch)
+                timings["translate"].append(time.perf_counter() - t0)
+                for offset, translation in enumerate(outputs):
+                    translated.put((start + offset, translation))
+            translated.put(_DONE)
+        except Exception as e:
+            translated.put(e)
+
+    wall_start = time.perf_counter()
+    translator = threading.Thread(target=translate_stage, name="pipeline-translate", daemon=True)
+    translator.start()
+
+    while True:
+        t0 = time.perf_counter()
+        item = translated.get()
+        timings["queue_wait"].append(time.perf_counter() - t0)
+        if item is _DONE:
+            break
+        if isinstance(item, Exception):
+            raise item
+
+        index, translation = item
+        t0 = time.perf_counter()
+        samples, sample_rate = synthesize(translation)
+        timings["synthesize"].append(time.perf_counter() - t0)
+        on_audio(index, translation, samples, sample_rate)
+
+    translator.join()
+    wall = time.perf_counter() - wall_start
+
+    summary = {"segments": len(segments), "wall_seconds": round(wall, 3)}
+    for stage, values in timings.items():
+        summary[stage] = {
+            "total_seconds": round(sum(values), 3),
+            "mean_seconds": round(sum(values) / len(values), 3) if values else 0.0,
+            "max_seconds": round(max(values), 3) if values else 0.0,
+        }
+    # Time saved compared with running the stages back to back
+    summary["overlap_seconds"] = round(
+        summary["translate"]["total_seconds"] + summary["synthesize"]["total_seconds"] - wall, 3
+    )
+    return summary
+
+
+class WavSink:
+    """Appends synthesized segments to a 16-bit mono WAV file as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._wav = None
+
+    def __call__(self, index, translation, samples, sample_rate):
+        if self._wav is None:
+            self._wav = wave.open(self.path, "wb")
+            self._wav.setnchannels(1)
+            self._wav.setsampwidth(2)
+            self._wav.setframerate(sample_rate)
+        self._wav.writeframes(to_int16(samples).tobytes())
+        logger.info(f"Segment {index}: {translation[:60]}")
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="Transcript text file ('-' for stdin)")
+    parser.add_argument("--target-lang", required=True, help="NLLB target language code, e.g. hin_Deva")
+    parser.add_argument("--source-lang", default=None, help="NLLB source language code (default eng_Latn)")
+    parser.add_argument("--engine", choices=("f5", "xtts"), default="f5")
+    parser.add_argument("--ref-audio", required=True, help="Reference speaker audio")
+    parser.add_argument("--ref-text", default="", help="Transcript of the reference audio (F5 only)")
+    parser.add_argument("--xtts-language", default=None, help="XTTS language code (default: derived from --target-lang)")
+    parser.add_argument("--f5-model", default=None, help="voice_clone_model_list key (default: derived from --target-lang)")
+    parser.add_argument("--output", required=True, help="Output WAV path")
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--translate-batch-size", type=int, default=1)
+    parser.add_argument("--timings", default=None, help="Write stage timings as JSON to this path")
+    args = parser.parse_args()
+
+    text = sys.stdin.read() if args.input == "-" else open(args.input, encoding="utf-8").read()
+    segments, _ = segment_text(text)
+    if not segments:
+        parser.error("Input transcript is empty")
+    # Checked before any model is loaded
+    try:
+        args.source_lang, args.target_lang = LANGUAGES.translation_pair(args.source_lang or "eng_Latn", args.target_lang)
+        if args.engine == "xtts":
+            args.xtts_language = LANGUAGES.xtts(args.xtts_language or args.target_lang)
+        elif not args.f5_model:
+            args.f5_model = LANGUAGES.f5_model(args.target_lang)
+    except UnsupportedLanguage as e:
+        parser.error(str(e))
+    if args.engine == "f5" and args.f5_model:
+        from voice_models import voice_clone_model_list, unloadable_voice_models
+
+        if args.f5_model not in voice_clone_model_list:
+            parser.error(f"Unknown F5 model '{args.f5_model}'")
+        if args.f5_model in unloadable_voice_models:
+            parser.error(f"F5 model '{args.f5_model}' can't be loaded: {unloadable_voice_models[args.f5_model]}")
+
+    translate = load_translator(args.target_lang, args.source_lang)
+    if args.engine == "f5":
+        synthesize = load_f5_synthesizer(args.ref_audio, args.ref_text, args.f5_model)
+    else:
+        synthesize = load_xtts_synthesizer(args.ref_audio, args.xtts_language)
+
+    sink = WavSink(args.output)
+    try:
+        summary = run_pipeline(
+            segments, translate, synthesize, sink,
+            queue_size=args.queue_size, translate_batch_size=args.translate_batch_size,
+        )
+    finally:
+        sink.close()
+
+    print(json.dumps(summary, indent=2))
+    if args.timings:
+        with open(args.timings, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()